@@ -3,26 +3,126 @@ import pandas as pd
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
 import time
-from weather_service import WeatherService
-from utils import format_temperature, get_weather_icon, format_date, create_forecast_chart
-
-# Initialize weather service
-weather_service = WeatherService()
+import os
+from weather_service import CACHE_LIMITS, SERVICE_UNAVAILABLE, WeatherService
+from cache import SQLiteCache
+from ratelimit import RateLimiter
+from prewarm import HotCityPrewarmer
+from gazetteer import Gazetteer
+from utils import format_temperature, create_forecast_chart, create_trend_chart, forecast_daily_view
+from weather_store import WeatherStore
+from render_cache import TEMPERATURE_UNITS, RenderCache
+from history import HistoryStore
+from metrics import MetricsExporter
+from profiler import ProfileStats, RerunProfiler
+
+# Opt-in rerun profiling: set WEATHER_PROFILE=1 or open the app with ?profile=1
+@st.cache_resource
+def get_profile_stats():
+    return ProfileStats()
+
+profiler = RerunProfiler(get_profile_stats(),
+                         enabled=bool(os.getenv("WEATHER_PROFILE")) or st.query_params.get("profile") == "1")
+profiler.phase("resources")
+
+# Every fetched observation and forecast is kept in a local history store
+@st.cache_resource
+def get_history_store():
+    return HistoryStore(os.getenv("WEATHER_HISTORY_PATH", "weather_history")).start()
+
+history_store = get_history_store()
+
+# Initialize weather service once per server process so every session and
+# rerun shares the same pooled, keep-alive HTTP connections
+@st.cache_resource
+def get_weather_service():
+    # Responses are cached on disk so a restarted server starts warm
+    cache_path = os.getenv("WEATHER_CACHE_PATH", "weather_cache.sqlite3")
+    cache = SQLiteCache(cache_path, limits=CACHE_LIMITS)
+    # The API quota is shared by every server process through the same file
+    rate_limiter = RateLimiter(int(os.getenv("OPENWEATHERMAP_CALLS_PER_MINUTE", "60")), path=cache_path)
+    # Calls slower than the endpoint's 95th percentile are hedged with a duplicate request
+    return WeatherService(cache=cache, gazetteer=load_gazetteer(), rate_limiter=rate_limiter, hedge_after="p95",
+                          history=history_store)
+
+def load_gazetteer():
+    # City suggestions come from a local GeoNames dump when one is installed
+    path = os.getenv("GAZETTEER_PATH", "data/cities15000.zip")
+    if not os.path.exists(path):
+        return None
+    return Gazetteer.from_geonames(path, os.getenv("GAZETTEER_ADMIN1_PATH", "data/admin1CodesASCII.txt"))
+
+weather_service = get_weather_service()
+
+# Popular cities are shown to new users and kept fresh in the cache
+EXAMPLE_CITIES = ["London", "New York", "Tokyo", "Paris", "Sydney", "Mumbai"]
+
+@st.cache_resource
+def start_prewarmer():
+    prewarmer = HotCityPrewarmer(weather_service, EXAMPLE_CITIES)
+    prewarmer.start()
+    return prewarmer
+
+start_prewarmer()
+
+# Metrics are served on a local port and/or written to a file when configured
+@st.cache_resource
+def start_metrics_exporter():
+    port = os.getenv("WEATHER_METRICS_PORT")
+    path = os.getenv("WEATHER_METRICS_FILE")
+    if not port and not path:
+        return None
+    return MetricsExporter(weather_service.metrics_text, port=int(port) if port else None, path=path).start()
+
+start_metrics_exporter()
+
+# Decoded weather is stored once per location and shared by all sessions
+@st.cache_resource
+def get_weather_store():
+    return WeatherStore()
+
+weather_store = get_weather_store()
+
+# Forecast figures and table rows are built once per forecast and unit for all sessions
+@st.cache_resource
+def get_render_cache():
+    return RenderCache()
+
+render_cache = get_render_cache()
+
+def load_weather(city, force_refresh=False):
+    """Fetch a city's current weather and forecast into the shared store
+    
+    Returns (handle, bundle); handle is None if the city was not found. The
+    handle only changes if the content did, so comparing it with the
+    session's tells whether anything new arrived.
+    """
+    # Fetch current weather and forecast concurrently; a forced refresh revalidates with upstream
+    bundle = weather_service.get_weather_bundle(city, parts=('current', 'forecast'), force_refresh=force_refresh)
+    if not bundle['current']:
+        return None, bundle
+    key = weather_service.location_key(city) or f"q:{city}"
+    return weather_store.put(key, bundle['current'], bundle['forecast'], bundle['digests']), bundle
+
+profiler.phase("session state")
 
 # Initialize session state first
-if "weather_data" not in st.session_state:
-    st.session_state.weather_data = None
-if "forecast_data" not in st.session_state:
-    st.session_state.forecast_data = None
+# Sessions keep only a handle to the shared weather store
+if "weather_handle" not in st.session_state:
+    st.session_state.weather_handle = None
 if "last_search" not in st.session_state:
     st.session_state.last_search = ""
 if "last_update" not in st.session_state:
     st.session_state.last_update = None
+if "refreshed_at" not in st.session_state:
+    st.session_state.refreshed_at = {}  # section -> time its data was last re-fetched
 if "likes" not in st.session_state:
     st.session_state.likes = 0
 if "dislikes" not in st.session_state:
     st.session_state.dislikes = 0
 
+profiler.phase("page config and CSS")
+
 # Page configuration
 st.set_page_config(
     page_title="Weather App",
@@ -164,6 +264,8 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+profiler.phase("header and sidebar")
+
 # Title and description with animation
 st.markdown('<div class="title-animation">🌤️ Weather Dashboard</div>', unsafe_allow_html=True)
 st.markdown('<div style="text-align: center; font-size: 1.2rem; margin-bottom: 30px; animation: fadeIn 1.2s ease-out;">Get current weather conditions and 5-day forecasts for any city worldwide</div>', unsafe_allow_html=True)
@@ -172,12 +274,15 @@ st.markdown('<div style="text-align: center; font-size: 1.2rem; margin-bottom: 3
 st.sidebar.header("Settings")
 temp_unit = st.sidebar.selectbox(
     "Temperature Unit",
-    ["Celsius", "Fahrenheit"],
+    list(TEMPERATURE_UNITS),
     key="temp_unit"
 )
 
-# Auto-refresh toggle
+# Auto-refresh toggle; the weather sections then rerun on their own timer
+# instead of the whole script
 auto_refresh = st.sidebar.checkbox("Auto-refresh every minute", key="auto_refresh")
+REFRESH_INTERVAL = 60
+refresh_every = REFRESH_INTERVAL if auto_refresh else None
 
 # Display format toggle
 display_format = st.sidebar.selectbox(
@@ -216,6 +321,8 @@ with col2:
         st.session_state.dislikes += 1
         st.rerun()
 
+profiler.phase("search form")
+
 # Main search section with animation
 st.markdown('<div class="search-container">', unsafe_allow_html=True)
 st.markdown('<h2 style="color: white; text-align: center; margin-bottom: 20px;">🔍 Search Location</h2>', unsafe_allow_html=True)
@@ -233,56 +340,104 @@ with col2:
     refresh_button = st.button("🔄 Refresh")
 st.markdown('</div>', unsafe_allow_html=True)
 
-
-
-# Auto-refresh functionality
-if auto_refresh and st.session_state.last_search:
-    current_time = time.time()
-    if (st.session_state.last_update is None or 
-        current_time - st.session_state.last_update > 60):
-        st.rerun()
+profiler.phase("search", reused=True)
 
 # Search functionality
 if (search_button and city_input) or (refresh_button and st.session_state.last_search):
     search_city = city_input if search_button else st.session_state.last_search
     if search_button and city_input != st.session_state.last_search or refresh_button:
+        profiler.mark_reused(False)
         st.markdown('<div class="loading-spinner">🌀</div> <span style="color: #667eea; font-weight: bold;">Fetching weather data...</span>', unsafe_allow_html=True)
         with st.spinner(""):
             try:
-                # Get current weather
-                current_weather = weather_service.get_current_weather(search_city)
+                handle, bundle = load_weather(search_city, force_refresh=refresh_button)
                 
-                if current_weather:
-                    st.session_state.weather_data = current_weather
-                    st.session_state.last_search = search_city
+                if handle:
+                    unchanged = refresh_button and handle == st.session_state.weather_handle
+                    if not unchanged:
+                        st.session_state.weather_handle = handle
+                        st.session_state.last_search = search_city
+                        st.session_state.last_update = time.time()
+                        st.session_state.refreshed_at = {}
                     
-                    # Get forecast data
-                    forecast_data = weather_service.get_forecast(search_city)
-                    st.session_state.forecast_data = forecast_data
-                    st.session_state.last_update = time.time()
+                    if 'forecast' in bundle['errors']:
+                        st.warning(f"Forecast unavailable: {bundle['errors']['forecast']}")
+                    if bundle['stale']:
+                        st.warning(f"{SERVICE_UNAVAILABLE}. Showing the last known {' and '.join(bundle['stale'])} data.")
                     
-                    st.success(f"Weather data loaded for {current_weather['name']}")
+                    if unchanged:
+                        # Same content: the session keeps its handle and the memoized views
+                        st.info(f"Weather data unchanged for {bundle['current']['name']}")
+                    else:
+                        st.success(f"Weather data loaded for {bundle['current']['name']}")
+                elif bundle['errors'].get('current') == SERVICE_UNAVAILABLE:
+                    st.error(f"{SERVICE_UNAVAILABLE}. Please try again in a minute.")
+                    st.session_state.weather_handle = None
                 else:
                     st.error("City not found. Please check the spelling and try again.")
-                    st.session_state.weather_data = None
-                    st.session_state.forecast_data = None
+                    st.session_state.weather_handle = None
                     
             except Exception as e:
                 st.error(f"Error fetching weather data: {str(e)}")
-                st.session_state.weather_data = None
-                st.session_state.forecast_data = None
-
-# Display current weather
-if st.session_state.weather_data:
-    weather_data = st.session_state.weather_data
+                st.session_state.weather_handle = None
+
+profiler.phase("resolve", reused=True)
+
+def resolve_weather():
+    """Resolve this session's handle to the shared decoded (current, forecast), or None"""
+    if st.session_state.weather_handle is None:
+        return None
+    stored = weather_store.get(st.session_state.weather_handle)
+    if stored is None and st.session_state.last_search:
+        # Dropped from the shared store; reload (normally from the service cache)
+        profiler.mark_reused(False)
+        handle, _ = load_weather(st.session_state.last_search)
+        st.session_state.weather_handle = handle
+        stored = weather_store.get(handle) if handle else None
+    return stored
+
+def refreshed_weather(section, part):
+    """Resolve the shown location for a section, first re-fetching its part if a refresh is due
+    
+    The part is read through the service cache, which revalidates expired
+    responses conditionally, and only decoded and stored again if its upstream
+    digest changed, so an unchanged refresh costs a comparison.
+    """
+    now = time.time()
+    last = st.session_state.refreshed_at.get(section, st.session_state.last_update or now)
+    if auto_refresh and st.session_state.weather_handle is not None and now - last >= REFRESH_INTERVAL:
+        st.session_state.refreshed_at[section] = now
+        data, digest = weather_service.get_part(part, st.session_state.last_search)
+        if data:
+            handle, changed = weather_store.update(st.session_state.weather_handle.key, part, data, digest)
+            if changed:
+                st.session_state.weather_handle = handle
+    return resolve_weather()
+
+weather_data = None
+forecast_frame = None
+stored = resolve_weather()
+if stored is not None:
+    weather_data, forecast_frame = stored
+
+profiler.phase("current weather")
+
+# Display current weather; reruns on its own while auto-refresh is on
+@st.fragment(run_every=refresh_every)
+def current_weather_section():
+    stored = refreshed_weather('current', 'current')
+    if stored is None:
+        return
+    weather_data = stored[0]
     
     # Show last update time
-    if st.session_state.last_update:
-        last_update_time = datetime.fromtimestamp(st.session_state.last_update)
+    last_update = max(st.session_state.last_update or 0, st.session_state.refreshed_at.get('current', 0))
+    if last_update:
+        last_update_time = datetime.fromtimestamp(last_update)
         st.markdown(f'<div style="text-align: center; color: #667eea; font-style: italic;">Last updated: {last_update_time.strftime("%H:%M:%S")}</div>', unsafe_allow_html=True)
     
     st.markdown('<div class="weather-card">', unsafe_allow_html=True)
-    st.markdown(f'<h2 style="color: white; text-align: center; margin-bottom: 20px;">Current Weather in {weather_data["name"]}, {weather_data["sys"]["country"]}</h2>', unsafe_allow_html=True)
+    st.markdown(f'<h2 style="color: white; text-align: center; margin-bottom: 20px;">Current Weather in {weather_data.name}, {weather_data.country}</h2>', unsafe_allow_html=True)
     
     # Main weather info with animated cards
     col1, col2, col3, col4 = st.columns(4)
@@ -291,8 +446,8 @@ if st.session_state.weather_data:
         st.markdown('<div class="metric-card">', unsafe_allow_html=True)
         st.metric(
             "Temperature",
-            format_temperature(weather_data['main']['temp'], temp_unit),
-            delta=f"Feels like {format_temperature(weather_data['main']['feels_like'], temp_unit)}"
+            format_temperature(weather_data.temp, temp_unit),
+            delta=f"Feels like {format_temperature(weather_data.feels_like, temp_unit)}"
         )
         st.markdown('</div>', unsafe_allow_html=True)
     
@@ -300,7 +455,7 @@ if st.session_state.weather_data:
         st.markdown('<div class="metric-card">', unsafe_allow_html=True)
         st.metric(
             "Humidity",
-            f"{weather_data['main']['humidity']}%"
+            f"{weather_data.humidity}%"
         )
         st.markdown('</div>', unsafe_allow_html=True)
     
@@ -308,7 +463,7 @@ if st.session_state.weather_data:
         st.markdown('<div class="metric-card">', unsafe_allow_html=True)
         st.metric(
             "Wind Speed",
-            f"{weather_data['wind']['speed']} m/s"
+            f"{weather_data.wind_speed} m/s"
         )
         st.markdown('</div>', unsafe_allow_html=True)
     
@@ -316,7 +471,7 @@ if st.session_state.weather_data:
         st.markdown('<div class="metric-card">', unsafe_allow_html=True)
         st.metric(
             "Pressure",
-            f"{weather_data['main']['pressure']} hPa"
+            f"{weather_data.pressure} hPa"
         )
         st.markdown('</div>', unsafe_allow_html=True)
     
@@ -340,7 +495,7 @@ if st.session_state.weather_data:
     col1, col2 = st.columns(2)
     
     with col1:
-        sunrise = datetime.fromtimestamp(weather_data['sys']['sunrise'])
+        sunrise = datetime.fromtimestamp(weather_data.sunrise)
         st.markdown(f"""
         <div style="
             background: linear-gradient(45deg, #FFD700, #FFA500);
@@ -360,7 +515,7 @@ if st.session_state.weather_data:
         """, unsafe_allow_html=True)
     
     with col2:
-        sunset = datetime.fromtimestamp(weather_data['sys']['sunset'])
+        sunset = datetime.fromtimestamp(weather_data.sunset)
         st.markdown(f"""
         <div style="
             background: linear-gradient(45deg, #FF6B35, #F7931E);
@@ -379,8 +534,16 @@ if st.session_state.weather_data:
         </div>
         """, unsafe_allow_html=True)
 
-# Display 5-day forecast with animation
-if st.session_state.forecast_data:
+if weather_data is not None:
+    current_weather_section()
+
+# Display 5-day forecast with animation; reruns on its own while auto-refresh is on
+@st.fragment(run_every=refresh_every)
+def forecast_section():
+    stored = refreshed_weather('forecast', 'forecast')
+    if stored is None or stored[1] is None:
+        return
+    profiler.phase("forecast aggregation")
     st.markdown("""
     <div style="
         background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
@@ -394,76 +557,42 @@ if st.session_state.forecast_data:
     </div>
     """, unsafe_allow_html=True)
     
-    forecast_data = st.session_state.forecast_data
+    frame = stored[1]
     
-    # Process forecast data
-    daily_forecasts = []
-    current_date = None
-    daily_temps = []
-    
-    for item in forecast_data['list']:
-        forecast_date = datetime.fromtimestamp(item['dt'])
-        date_str = forecast_date.strftime('%Y-%m-%d')
-        
-        if date_str != current_date:
-            if daily_temps:
-                daily_forecasts.append({
-                    'date': current_date,
-                    'min_temp': min(daily_temps),
-                    'max_temp': max(daily_temps),
-                    'weather': daily_weather,
-                    'icon': daily_icon
-                })
-            
-            current_date = date_str
-            daily_temps = [item['main']['temp']]
-            daily_weather = item['weather'][0]['description']
-            daily_icon = item['weather'][0]['icon']
-        else:
-            daily_temps.append(item['main']['temp'])
-    
-    # Add the last day
-    if daily_temps:
-        daily_forecasts.append({
-            'date': current_date,
-            'min_temp': min(daily_temps),
-            'max_temp': max(daily_temps),
-            'weather': daily_weather,
-            'icon': daily_icon
-        })
+    # Aggregate the 3-hour slots per local calendar day; the rows for both
+    # units are built once per forecast content and shared by every session
+    daily, reused = render_cache.get(frame.digest, 'daily', temp_unit, lambda unit: forecast_daily_view(frame, unit))
+    profiler.mark_reused(reused)
     
     # Display forecast based on selected format
-    if daily_forecasts:
+    profiler.phase(f"forecast {display_format.lower()}")
+    if daily['day']:
+        day_names = daily['day']
+        date_labels = daily['date']
+        weather_icons = daily['icon']
+        descriptions = daily['description']
+        highs = daily['high']
+        lows = daily['low']
+        
         if display_format == "Table":
             # Create table format
-            table_data = []
-            for forecast in daily_forecasts[:5]:
-                date_obj = datetime.strptime(forecast['date'], '%Y-%m-%d')
-                day_name = date_obj.strftime('%A')
-                weather_icon = get_weather_icon(forecast['icon'])
-                
-                table_data.append({
-                    'Day': day_name,
-                    'Date': format_date(forecast['date']),
-                    'Weather': weather_icon + ' ' + forecast['weather'].title(),
-                    'High': format_temperature(forecast['max_temp'], temp_unit),
-                    'Low': format_temperature(forecast['min_temp'], temp_unit)
-                })
-            
-            df = pd.DataFrame(table_data)
+            df = pd.DataFrame({
+                'Day': day_names,
+                'Date': date_labels,
+                'Weather': [f"{icon} {description}" for icon, description in zip(weather_icons, descriptions)],
+                'High': highs,
+                'Low': lows
+            })
             st.markdown('<div class="forecast-table">', unsafe_allow_html=True)
             st.dataframe(df, use_container_width=True, hide_index=True)
             st.markdown('</div>', unsafe_allow_html=True)
         
         else:
             # Display as animated cards
-            cols = st.columns(min(5, len(daily_forecasts)))
+            cols = st.columns(len(day_names))
             
-            for i, forecast in enumerate(daily_forecasts[:5]):
+            for i in range(len(day_names)):
                 with cols[i]:
-                    date_obj = datetime.strptime(forecast['date'], '%Y-%m-%d')
-                    day_name = date_obj.strftime('%A')
-                    
                     # Staggered animation delay for each card
                     delay = i * 0.2
                     st.markdown(f"""
@@ -479,16 +608,26 @@ if st.session_state.forecast_data:
                         box-shadow: 0 8px 25px rgba(79,172,254,0.3);
                         transition: transform 0.3s ease;
                     ">
-                        <div style="font-size: 1.2rem; margin-bottom: 5px;">{day_name}</div>
-                        <div style="font-size: 1rem; margin-bottom: 10px; opacity: 0.9;">{format_date(forecast['date'])}</div>
-                        <div class='weather-icon' style='font-size: 40px; margin: 10px 0;'>{get_weather_icon(forecast['icon'])}</div>
-                        <div style="font-size: 1.1rem; margin: 5px 0;">High: {format_temperature(forecast['max_temp'], temp_unit)}</div>
-                        <div style="font-size: 1.1rem; margin: 5px 0;">Low: {format_temperature(forecast['min_temp'], temp_unit)}</div>
-                        <div style="font-size: 0.9rem; font-style: italic; opacity: 0.9;">{forecast['weather'].title()}</div>
+                        <div style="font-size: 1.2rem; margin-bottom: 5px;">{day_names[i]}</div>
+                        <div style="font-size: 1rem; margin-bottom: 10px; opacity: 0.9;">{date_labels[i]}</div>
+                        <div class='weather-icon' style='font-size: 40px; margin: 10px 0;'>{weather_icons[i]}</div>
+                        <div style="font-size: 1.1rem; margin: 5px 0;">High: {highs[i]}</div>
+                        <div style="font-size: 1.1rem; margin: 5px 0;">Low: {lows[i]}</div>
+                        <div style="font-size: 0.9rem; font-style: italic; opacity: 0.9;">{descriptions[i]}</div>
                     </div>
                     """, unsafe_allow_html=True)
-    
-    # Animated Temperature trend chart
+
+if forecast_frame is not None:
+    forecast_section()
+
+# Animated Temperature trend chart; reruns on its own while auto-refresh is on
+@st.fragment(run_every=refresh_every)
+def chart_section():
+    stored = refreshed_weather('chart', 'forecast')
+    if stored is None or stored[1] is None:
+        return
+    frame = stored[1]
+    profiler.phase("chart")
     st.markdown("""
     <div style="
         background: linear-gradient(135deg, #ffecd2 0%, #fcb69f 100%);
@@ -502,21 +641,56 @@ if st.session_state.forecast_data:
     </div>
     """, unsafe_allow_html=True)
     
-    if len(forecast_data['list']) > 0:
-        chart_data = []
-        for item in forecast_data['list'][:40]:  # Show next 5 days (8 forecasts per day)
-            chart_data.append({
-                'datetime': datetime.fromtimestamp(item['dt']),
-                'temperature': item['main']['temp'],
-                'feels_like': item['main']['feels_like']
-            })
-        
+    if len(frame) > 0:
         # Add animated container for the chart
         st.markdown('<div style="animation: slideIn 1.2s ease-out; margin: 20px 0;">', unsafe_allow_html=True)
-        chart = create_forecast_chart(chart_data, temp_unit)
+        # Show next 5 days (8 forecasts per day); figures for both units are
+        # built once per forecast content and reused until the data changes
+        chart, reused = render_cache.get(frame.digest, 'chart', temp_unit,
+                                         lambda unit: create_forecast_chart(frame.head(40), unit))
+        profiler.mark_reused(reused)
         st.plotly_chart(chart, use_container_width=True)
         st.markdown('</div>', unsafe_allow_html=True)
 
+if forecast_frame is not None:
+    chart_section()
+
+profiler.phase("history")
+
+# Observation history for the shown location, read from the local history store
+# rather than the network; longer periods use the pre-aggregated rollups
+HISTORY_PERIODS = {"24 hours": (1, None), "7 days": (7, 'hour'), "30 days": (30, 'hour'), "1 year": (365, 'day')}
+HISTORY_LABELS = {None: "observations", 'hour': "hourly averages", 'day': "daily averages"}
+
+# Reruns reuse the last read until this process stores new rows (generation is
+# only part of the cache key); the TTL picks up rows written by other processes
+@st.cache_data(ttl=60, max_entries=100, show_spinner=False)
+def load_history(location, days, resolution, generation):
+    end = time.time()
+    if resolution is None:
+        return history_store.query(location, end - days * 86400, end)
+    return history_store.rollup(location, end - days * 86400, end, resolution)
+
+if weather_data is not None and st.toggle("📜 Show history", key="show_history"):
+    period = st.radio("Period", list(HISTORY_PERIODS), horizontal=True, key="history_period")
+    days, resolution = HISTORY_PERIODS[period]
+    history = load_history(st.session_state.weather_handle.key, days, resolution, history_store.generation)
+    if resolution is None:
+        temperatures, feels_like = history['temp'], history['feels_like']
+    else:
+        temperatures, feels_like = history.get('temp_mean'), history.get('feels_like_mean')
+    
+    if len(history):
+        # Shown in the city's local time, like the forecast
+        times = (history['time'].dt.tz_localize(None) + pd.Timedelta(seconds=weather_data.timezone)).to_numpy()
+        chart = create_trend_chart(times, temperatures, feels_like, temp_unit, "Temperature History")
+        st.plotly_chart(chart, use_container_width=True)
+        st.caption(f"{len(history)} {HISTORY_LABELS[resolution]} from the local history store")
+    else:
+        st.info("No history recorded for this location yet. Observations are kept each time its weather is fetched.")
+
+profiler.phase("footer and sidebar stats")
+
 # Animated Footer
 st.markdown("---")
 st.markdown("""
@@ -535,16 +709,88 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
+# Memory used by this session and by the shared store
+if st.session_state.weather_handle is not None:
+    own_bytes, shared_bytes = weather_store.session_usage(st.session_state.weather_handle)
+    store_usage = weather_store.memory_usage()
+    st.sidebar.caption(
+        f"Session memory: {own_bytes / 1024:.1f} KB own + {shared_bytes / 1024:.1f} KB shared · "
+        f"All sessions: {store_usage['bytes'] / 1024:.1f} KB for {store_usage['locations']} locations"
+    )
+
+# Response cache usage across all endpoints
+cache_stats = weather_service.cache.stats()
+if cache_stats:
+    lookups = sum(s['hits'] + s['misses'] for s in cache_stats.values())
+    st.sidebar.caption(
+        f"Response cache: {sum(s['entries'] for s in cache_stats.values())} entries, "
+        f"{sum(s['bytes'] for s in cache_stats.values()) / 1024:.1f} KB · "
+        f"hit rate {sum(s['hits'] for s in cache_stats.values()) / max(lookups, 1):.0%} · "
+        f"{sum(s['evictions'] for s in cache_stats.values())} evicted"
+    )
+
+# Optional admin panel with upstream and cache metrics
+if os.getenv("WEATHER_ADMIN_PANEL") and st.sidebar.checkbox("Show service metrics", key="show_metrics"):
+    metrics = weather_service.metrics
+    responses = metrics.counters('weather_upstream_responses_total')
+    timeouts = metrics.counters('weather_upstream_timeouts_total')
+    errors = metrics.counters('weather_upstream_errors_total')
+    received = metrics.counters('weather_upstream_response_bytes_total')
+    not_modified = metrics.counters('weather_upstream_not_modified_total')
+    endpoint_rows = []
+    for labels, (count, total) in sorted(metrics.histograms('weather_upstream_request_duration_seconds').items()):
+        endpoint = dict(labels)['endpoint']
+        p50 = metrics.quantile('weather_upstream_request_duration_seconds', 0.5, {'endpoint': endpoint})
+        p95 = metrics.quantile('weather_upstream_request_duration_seconds', 0.95, {'endpoint': endpoint})
+        endpoint_rows.append({
+            'Endpoint': endpoint,
+            'Calls': int(count),
+            'Mean ms': round(total / count * 1000, 1),
+            'p50 ms': round(p50 * 1000, 1),
+            'p95 ms': round(p95 * 1000, 1),
+            'Non-200': int(sum(v for l, v in responses.items() if dict(l)['endpoint'] == endpoint and dict(l)['code'] not in ('200', '304'))),
+            'Unchanged': int(sum(v for l, v in not_modified.items() if dict(l)['endpoint'] == endpoint)),
+            'Timeouts': int(timeouts.get(labels, 0)),
+            'Errors': int(sum(v for l, v in errors.items() if dict(l)['endpoint'] == endpoint)),
+            'KB': round(received.get(labels, 0) / 1024, 1),
+        })
+    cache_rows = {}
+    for labels, value in metrics.counters('weather_cache_requests_total').items():
+        labels = dict(labels)
+        cache_rows.setdefault(labels['namespace'], {'Namespace': labels['namespace'], 'hit': 0, 'stale': 0, 'miss': 0})
+        cache_rows[labels['namespace']][labels['result']] = int(value)
+    
+    with st.sidebar.expander("Service metrics", expanded=True):
+        st.markdown("**Upstream calls**")
+        st.dataframe(pd.DataFrame(endpoint_rows), hide_index=True)
+        st.markdown("**Cache lookups**")
+        st.dataframe(pd.DataFrame(sorted(cache_rows.values(), key=lambda row: row['Namespace'])), hide_index=True)
+        st.download_button("Download Prometheus metrics", weather_service.metrics_text(),
+                           file_name="weather_metrics.prom", mime="text/plain")
+
 # Instructions for first-time users
-if not st.session_state.weather_data:
+if weather_data is None:
     st.info("👆 Enter a city name above to get started with weather information!")
     
     # Show some example cities
     st.markdown("### Popular Cities")
     st.markdown("Try searching for these popular cities:")
-    example_cities = ["London", "New York", "Tokyo", "Paris", "Sydney", "Mumbai"]
-    
     cols = st.columns(3)
-    for i, city in enumerate(example_cities):
+    for i, city in enumerate(EXAMPLE_CITIES):
         with cols[i % 3]:
             st.markdown(f"• **{city}**")
+
+
+# Rerun profile (opt-in), shown last so every phase above is finished
+if profiler.enabled:
+    profiler.finish()
+    with st.sidebar.expander("Rerun profile", expanded=True):
+        st.caption(f"This rerun: {profiler.total * 1000:.1f} ms")
+        st.dataframe(pd.DataFrame(
+            [{'Phase': phase, 'ms': round(seconds * 1000, 2), 'Reused': reused}
+             for phase, seconds, reused in profiler.timings]
+        ), hide_index=True)
+        st.caption(f"All reruns ({profiler.stats.reruns})")
+        st.dataframe(pd.DataFrame(profiler.stats.summary()).round(2), hide_index=True)
+        if st.button("Reset profile", key="reset_profile"):
+            profiler.stats.reset()
\ No newline at end of file
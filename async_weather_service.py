@@ -0,0 +1,177 @@
+import asyncio
+import aiohttp
+import streamlit as st
+import os
+from weather_service import MAX_RETRY_DELAY, RETRY_STATUSES
+
+class AsyncWeatherService:
+    """asyncio counterpart of WeatherService with the same return shapes and error semantics"""
+    
+    def __init__(self, max_concurrency=50, pool_maxsize=20, max_retries=2, backoff_factor=0.3):
+        self.api_key = os.getenv("OPENWEATHERMAP_API_KEY", "your_api_key_here")
+        self.base_url = os.getenv("OPENWEATHERMAP_BASE_URL", "https://api.openweathermap.org/data/2.5")
+        self.geo_url = os.getenv("OPENWEATHERMAP_GEO_URL", "https://api.openweathermap.org/geo/1.0")
+        self.pool_maxsize = pool_maxsize
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self._semaphore = asyncio.Semaphore(max_concurrency)  # requests in flight
+        self._session = None
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+    
+    def _get_session(self):
+        """Create the shared keep-alive session on first use"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=0,  # bounded by the semaphore instead
+                limit_per_host=self.pool_maxsize,
+                ttl_dns_cache=300
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+    
+    async def close(self):
+        """Close all pooled connections"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+    
+    async def _get(self, url, params, timeout):
+        """GET url and return (status_code, decoded JSON or None), retrying 5xx and connection errors with backoff"""
+        session = self._get_session()
+        client_timeout = aiohttp.ClientTimeout(total=timeout)
+        
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                last_attempt = attempt == self.max_retries
+                try:
+                    async with session.get(url, params=params, timeout=client_timeout) as response:
+                        if response.status in RETRY_STATUSES and not last_attempt:
+                            # Like WeatherService, a Retry-After beyond the cap returns the response instead
+                            delay = self.backoff_factor * (2 ** attempt)
+                            retry_after = response.headers.get('Retry-After', '').strip()
+                            if retry_after.isdigit():
+                                delay = max(delay, int(retry_after))
+                            if delay <= MAX_RETRY_DELAY:
+                                await asyncio.sleep(delay)
+                                continue
+                        if response.status == 200:
+                            return response.status, await response.json(content_type=None)
+                        return response.status, None
+                except aiohttp.ClientConnectionError:
+                    if last_attempt:
+                        raise
+                    await asyncio.sleep(self.backoff_factor * (2 ** attempt))
+    
+    async def _make_request(self, endpoint, params):
+        """Make API request with error handling"""
+        try:
+            params['appid'] = self.api_key
+            status, data = await self._get(f"{self.base_url}/{endpoint}", params, timeout=10)
+            
+            if status == 200:
+                return data
+            elif status == 404:
+                return None
+            elif status == 401:
+                st.error("Invalid API key. Please check your OpenWeatherMap API key.")
+                return None
+            else:
+                st.error(f"API request failed with status code: {status}")
+                return None
+                
+        except asyncio.TimeoutError:
+            st.error("Request timed out. Please try again.")
+            return None
+        except aiohttp.ClientConnectionError:
+            st.error("Connection error. Please check your internet connection.")
+            return None
+        except aiohttp.ClientError as e:
+            st.error(f"Request failed: {str(e)}")
+            return None
+    
+    async def get_current_weather(self, city):
+        """Get current weather data for a city"""
+        params = {
+            'q': city,
+            'units': 'metric'
+        }
+        
+        return await self._make_request('weather', params)
+    
+    async def get_forecast(self, city):
+        """Get 5-day weather forecast for a city"""
+        params = {
+            'q': city,
+            'units': 'metric'
+        }
+        
+        return await self._make_request('forecast', params)
+    
+    async def get_weather_alerts(self, lat, lon):
+        """Get weather alerts for specific coordinates"""
+        params = {
+            'lat': lat,
+            'lon': lon,
+            'exclude': 'current,minutely,hourly,daily',
+            'appid': self.api_key
+        }
+        
+        try:
+            status, data = await self._get(f"{self.base_url}/onecall", params, timeout=10)
+            
+            if status == 200:
+                return data.get('alerts', [])
+            else:
+                return []
+                
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return []
+    
+    async def search_cities(self, query, limit=5):
+        """Search for cities with autocomplete suggestions"""
+        if len(query) < 2:
+            return []
+        
+        params = {
+            'q': query,
+            'limit': limit,
+            'appid': self.api_key
+        }
+        
+        try:
+            status, cities = await self._get(f"{self.geo_url}/direct", params, timeout=5)
+            
+            if status == 200:
+                return [
+                    f"{city['name']}, {city.get('state', '')}, {city['country']}"
+                    for city in cities
+                ]
+            else:
+                return []
+                
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return []
+    
+    async def get_air_quality(self, lat, lon):
+        """Get air quality data for specific coordinates"""
+        params = {
+            'lat': lat,
+            'lon': lon,
+            'appid': self.api_key
+        }
+        
+        try:
+            status, data = await self._get(f"{self.base_url}/air_pollution", params, timeout=10)
+            
+            if status == 200:
+                return data
+            else:
+                return None
+                
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return None
@@ -0,0 +1,304 @@
+"""Fetch current weather and forecasts for many locations without the dashboard
+
+Reads one city query per line from a file (or stdin with -) and streams
+normalized rows, one for the current conditions and one per forecast slot, to
+CSV, JSON Lines or Parquet:
+    
+    python batch.py cities.txt -o weather.csv
+    python batch.py cities.txt -o weather.parquet --chunk-size 1000
+    python batch.py cities.txt -o weather.csv --resume
+
+Locations are processed in chunks; after each chunk the output is flushed and
+a checkpoint records how far the input got, so an interrupted run continues
+with --resume. Upstream calls share the dashboard's rate limit, but responses
+go to a separate cache so a large run does not evict the dashboard's entries.
+"""
+import argparse
+import csv
+import importlib.util
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from itertools import islice
+import pandas as pd
+from cache import CacheLimits, SQLiteCache
+from ratelimit import PRIORITY_BULK, RateLimiter
+from weather_service import CACHE_LIMITS, WeatherService
+
+# Columns of every output row, in order
+FIELDS = ('query', 'location', 'name', 'country', 'lat', 'lon', 'kind', 'time', 'temp', 'feels_like',
+          'temp_min', 'temp_max', 'humidity', 'pressure', 'wind_speed', 'wind_deg', 'description', 'icon',
+          'fetched_at')
+
+FORMATS = ('csv', 'jsonl', 'parquet')
+
+# The batch cache holds a few chunks of responses and every location geocoded so far,
+# so repeated runs over the same input skip geocoding
+BATCH_CACHE_LIMITS = dict(
+    CACHE_LIMITS,
+    weather=CacheLimits(max_entries=20000, max_bytes=64 * 2**20),
+    forecast=CacheLimits(max_entries=5000, max_bytes=256 * 2**20),
+    geo=CacheLimits(max_entries=500000, max_bytes=128 * 2**20),
+    cityid=CacheLimits(max_entries=500000, max_bytes=32 * 2**20),
+)
+
+def read_queries(lines):
+    """Yield city queries from lines, skipping blank lines and # comments"""
+    for line in lines:
+        query = line.strip()
+        if query and not query.startswith('#'):
+            yield query
+
+def _utc(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+def _row(query, key, place, kind, item, fetched_at):
+    main = item.get('main', {})
+    wind = item.get('wind', {})
+    weather = item['weather'][0] if item.get('weather') else {}
+    return {
+        'query': query,
+        'location': key,
+        'name': place.get('name'),
+        'country': place.get('country'),
+        'lat': place.get('coord', {}).get('lat'),
+        'lon': place.get('coord', {}).get('lon'),
+        'kind': kind,
+        'time': _utc(item['dt']) if 'dt' in item else None,
+        'temp': main.get('temp'),
+        'feels_like': main.get('feels_like'),
+        'temp_min': main.get('temp_min'),
+        'temp_max': main.get('temp_max'),
+        'humidity': main.get('humidity'),
+        'pressure': main.get('pressure'),
+        'wind_speed': wind.get('speed'),
+        'wind_deg': wind.get('deg'),
+        'description': weather.get('description'),
+        'icon': weather.get('icon'),
+        'fetched_at': fetched_at,
+    }
+
+def normalize(query, key, current, forecast, fetched_at):
+    """Return the output rows for one location: its current conditions, then each forecast slot"""
+    rows = []
+    if current:
+        place = {'name': current.get('name'), 'country': current.get('sys', {}).get('country'),
+                 'coord': current.get('coord', {})}
+        rows.append(_row(query, key, place, 'current', current, fetched_at))
+    if forecast:
+        place = forecast.get('city', {})
+        rows.extend(_row(query, key, place, 'forecast', item, fetched_at) for item in forecast.get('list', []))
+    return rows
+
+class CsvWriter:
+    """Append rows to a CSV file, with a header when the file is empty"""
+    
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a', newline='', encoding='utf-8')
+        self._writer = csv.DictWriter(self._file, fieldnames=FIELDS)
+        if self._file.tell() == 0:
+            self._writer.writeheader()
+    
+    def write(self, rows):
+        self._writer.writerows(rows)
+    
+    def flush(self):
+        """Write buffered rows to disk and return the position to resume from"""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return os.fstat(self._file.fileno()).st_size
+    
+    def close(self):
+        self._file.close()
+
+class JsonLinesWriter(CsvWriter):
+    """Append rows to a JSON Lines file"""
+    
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a', encoding='utf-8')
+    
+    def write(self, rows):
+        self._file.writelines(json.dumps(row, ensure_ascii=False) + '\n' for row in rows)
+
+class ParquetWriter:
+    """Write each chunk of rows as the next part file of a Parquet dataset directory
+    
+    A Parquet file cannot be appended to once closed, so chunks become
+    part-00000.parquet, part-00001.parquet, ... which readers load as one
+    dataset (pd.read_parquet(path)).
+    """
+    
+    def __init__(self, path, parts=0):
+        self.path = path
+        self.parts = parts
+        os.makedirs(path, exist_ok=True)
+    
+    def write(self, rows):
+        if not rows:
+            return
+        df = pd.DataFrame(rows, columns=FIELDS)
+        for column in ('time', 'fetched_at'):
+            df[column] = pd.to_datetime(df[column], utc=True)
+        temporary = os.path.join(self.path, f".part-{self.parts:05d}.tmp")
+        df.to_parquet(temporary, index=False)
+        os.replace(temporary, os.path.join(self.path, f"part-{self.parts:05d}.parquet"))
+        self.parts += 1
+    
+    def flush(self):
+        return self.parts
+    
+    def close(self):
+        pass
+
+def open_writer(output, output_format, position):
+    """Open the writer for a format, continuing from a checkpointed position (None for a fresh run)"""
+    if output_format == 'parquet':
+        if position is None:
+            for name in os.listdir(output) if os.path.isdir(output) else ():
+                if name.startswith('part-') and name.endswith('.parquet'):
+                    os.remove(os.path.join(output, name))
+        return ParquetWriter(output, position or 0)
+    # Drop anything written after the last checkpoint (an interrupted chunk)
+    with open(output, 'a'):
+        pass
+    os.truncate(output, position or 0)
+    return CsvWriter(output) if output_format == 'csv' else JsonLinesWriter(output)
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def save_checkpoint(path, checkpoint):
+    """Atomically replace the checkpoint file"""
+    temporary = f"{path}.tmp"
+    with open(temporary, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f)
+    os.replace(temporary, path)
+
+def fetch_chunk(service, pool, queries, with_forecast):
+    """Fetch a chunk of locations concurrently, returning (rows, failed queries)"""
+    fetched_at = _utc(time.time())
+    unique = list(dict.fromkeys(queries))
+    # Current weather goes through the group endpoint where city IDs are known
+    current = service.get_current_weather_many(unique, priority=PRIORITY_BULK)
+    
+    def forecast(query):
+        with service.rate_limiter.priority(PRIORITY_BULK):
+            return service.get_forecast(query)
+    
+    forecasts = dict(zip(unique, pool.map(forecast, unique))) if with_forecast else {}
+    rows = []
+    failed = []
+    for query in queries:
+        if not current.get(query):
+            failed.append(query)
+            continue
+        rows.extend(normalize(query, service.location_key(query), current[query], forecasts.get(query), fetched_at))
+    return rows, failed
+
+def run(args, lines, service, log=sys.stderr):
+    """Process the input, returning totals {'locations', 'rows', 'failed'}"""
+    checkpoint_path = args.checkpoint or f"{args.output.rstrip(os.sep)}.checkpoint.json"
+    checkpoint = load_checkpoint(checkpoint_path) if args.resume else None
+    if checkpoint is not None and checkpoint['format'] != args.format:
+        raise ValueError(f"{checkpoint_path} was written for {checkpoint['format']} output")
+    if checkpoint is None:
+        checkpoint = {'format': args.format, 'input': 0, 'position': None, 'locations': 0, 'rows': 0, 'failed': 0}
+    else:
+        print(f"Resuming after {checkpoint['input']} locations", file=log)
+    
+    writer = open_writer(args.output, args.format, checkpoint['position'])
+    errors = open(args.errors, 'a' if args.resume else 'w', encoding='utf-8') if args.errors else None
+    queries = islice(read_queries(lines), checkpoint['input'], None)
+    try:
+        with ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix="batch") as pool:
+            while True:
+                chunk = list(islice(queries, args.chunk_size))
+                if not chunk:
+                    break
+                rows, failed = fetch_chunk(service, pool, chunk, not args.no_forecast)
+                writer.write(rows)
+                if errors is not None:
+                    errors.writelines(query + '\n' for query in failed)
+                    errors.flush()
+                checkpoint['position'] = writer.flush()
+                checkpoint['input'] += len(chunk)
+                checkpoint['locations'] += len(chunk) - len(failed)
+                checkpoint['rows'] += len(rows)
+                checkpoint['failed'] += len(failed)
+                save_checkpoint(checkpoint_path, checkpoint)
+                print(f"{checkpoint['input']} locations, {checkpoint['rows']} rows, "
+                      f"{checkpoint['failed']} failed", file=log)
+    finally:
+        writer.close()
+        if errors is not None:
+            errors.close()
+    # Finished: a later run starts over instead of resuming
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return {name: checkpoint[name] for name in ('locations', 'rows', 'failed')}
+
+def make_service(args):
+    """Create a WeatherService with its own cache that shares the dashboard's rate limit file"""
+    # The dashboard keeps its token bucket in its cache file
+    limit_path = os.getenv("WEATHER_CACHE_PATH", "weather_cache.sqlite3")
+    # Batch calls leave the bucket's bulk reserve to the dashboard and may wait for as long as the quota needs
+    rate_limiter = RateLimiter(args.calls_per_minute, path=limit_path, max_wait={PRIORITY_BULK: args.max_wait})
+    return WeatherService(cache=SQLiteCache(args.cache, limits=BATCH_CACHE_LIMITS), rate_limiter=rate_limiter,
+                          max_workers=args.workers, pool_maxsize=max(20, args.workers))
+
+def main():
+    parser = argparse.ArgumentParser(description="Fetch weather for many locations into CSV, JSON Lines or Parquet")
+    parser.add_argument("input", help="file with one city query per line, or - for stdin")
+    parser.add_argument("-o", "--output", required=True,
+                        help="output file (.csv, .jsonl) or directory of Parquet parts (.parquet)")
+    parser.add_argument("--format", choices=FORMATS, help="output format (default: from the output name)")
+    parser.add_argument("--chunk-size", type=int, default=500, help="locations fetched and written per chunk")
+    parser.add_argument("--workers", type=int, default=8, help="concurrent upstream requests")
+    parser.add_argument("--calls-per-minute", type=int,
+                        default=int(os.getenv("OPENWEATHERMAP_CALLS_PER_MINUTE", "60")),
+                        help="upstream call quota shared with the dashboard")
+    parser.add_argument("--max-wait", type=float, default=3600.0,
+                        help="seconds a call may wait for the quota before the location is counted as failed")
+    parser.add_argument("--no-forecast", action="store_true", help="only fetch current conditions")
+    parser.add_argument("--resume", action="store_true", help="continue an interrupted run from its checkpoint")
+    parser.add_argument("--checkpoint", help="checkpoint file (default: <output>.checkpoint.json)")
+    parser.add_argument("--errors", help="write queries that could not be fetched to this file")
+    parser.add_argument("--cache", default=os.getenv("WEATHER_BATCH_CACHE_PATH", "weather_batch_cache.sqlite3"),
+                        help="response cache file, kept apart from the dashboard's")
+    args = parser.parse_args()
+    
+    if args.format is None:
+        extension = os.path.splitext(args.output.rstrip(os.sep))[1].lower()
+        args.format = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl', '.parquet': 'parquet'}.get(extension)
+        if args.format is None:
+            parser.error("cannot tell the output format from its name, pass --format")
+    if args.format == 'parquet' and not (importlib.util.find_spec('pyarrow') or importlib.util.find_spec('fastparquet')):
+        parser.error("Parquet output needs pyarrow (pip install pyarrow)")
+    
+    # st.error outside "streamlit run" only logs bare-mode warnings
+    logging.disable(logging.WARNING)
+    service = make_service(args)
+    try:
+        if args.input == '-':
+            totals = run(args, sys.stdin, service)
+        else:
+            with open(args.input, encoding='utf-8') as f:
+                totals = run(args, f, service)
+    except ValueError as e:
+        parser.error(str(e))
+    finally:
+        service.close()
+    print(f"Done: {totals['locations']} locations, {totals['rows']} rows, {totals['failed']} failed",
+          file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""Offline benchmarks for WeatherService and the dashboard's forecast/chart path
+
+Runs against a local StubOpenWeatherMap, so no API key or network access is
+needed:
+    
+    python benchmark.py
+    python benchmark.py --latency 0.05 --error-rate 0.02 --cities 200 --concurrency 32
+"""
+import argparse
+import json
+import logging
+import random
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from cache import MemoryCache
+from ratelimit import RateLimiter
+from render_cache import RenderCache
+from stub_server import StubOpenWeatherMap
+from utils import create_forecast_chart, forecast_daily_view
+from weather_service import CACHE_LIMITS, WeatherService
+from weather_store import WeatherStore
+
+def percentile(sorted_values, p):
+    """Return the p-th percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def make_service(stub, args):
+    """Create a WeatherService pointed at the stub with a fresh in-memory cache"""
+    service = WeatherService(
+        cache=MemoryCache(CACHE_LIMITS),
+        # The benchmark measures the service, not the upstream quota
+        rate_limiter=RateLimiter(calls_per_minute=10 ** 9),
+        hedge_after=args.hedge_after,
+        max_workers=max(8, args.concurrency),
+        pool_maxsize=max(20, args.concurrency),
+    )
+    service.base_url = stub.base_url
+    service.geo_url = stub.geo_url
+    return service
+
+def render(store, views, key, bundle, temp_unit):
+    """Repeat the app's per-rerun work for one city: store, aggregate and build the chart"""
+    handle = store.put(key, bundle['current'], bundle['forecast'])
+    _, frame = store.get(handle)
+    if frame is not None:
+        views.get(frame.digest, 'daily', temp_unit, lambda unit: forecast_daily_view(frame, unit))
+        chart, _ = views.get(frame.digest, 'chart', temp_unit, lambda unit: create_forecast_chart(frame.head(40), unit))
+        chart.to_json()
+
+def cache_counts(service):
+    """Return (hits, lookups) of current weather and forecast so far
+    
+    Counted per service call, not per backend lookup, so internal geocoding,
+    city ID and validator lookups do not inflate the hit rate.
+    """
+    hits = lookups = 0
+    for labels, value in service.metrics.counters('weather_cache_requests_total').items():
+        labels = dict(labels)
+        if labels['namespace'] in ('weather', 'forecast'):
+            lookups += value
+            hits += value if labels['result'] == 'hit' else 0
+    return hits, lookups
+
+def run_scenario(name, service, store, views, stub, cities, concurrency, with_render, trace_memory):
+    """Load a bundle (and optionally render it) for every city and return the measurements"""
+    stub.reset_calls()
+    hits_before, lookups_before = cache_counts(service)
+    latencies = []
+    errors = 0
+    
+    def one(city):
+        started = time.perf_counter()
+        bundle = service.get_weather_bundle(city, parts=('current', 'forecast'))
+        if bundle['current'] is None:
+            return time.perf_counter() - started, False
+        if with_render:
+            render(store, views, service.location_key(city), bundle, random.choice(("Celsius", "Fahrenheit")))
+        return time.perf_counter() - started, True
+    
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    if concurrency <= 1:
+        results = [one(city) for city in cities]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(one, cities))
+    elapsed = time.perf_counter() - started
+    peak = 0
+    if trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    
+    for latency, ok in results:
+        latencies.append(latency)
+        errors += not ok
+    latencies.sort()
+    hits, lookups = cache_counts(service)
+    hits, lookups = hits - hits_before, lookups - lookups_before
+    return {
+        'scenario': name,
+        'operations': len(cities),
+        'errors': errors,
+        'seconds': elapsed,
+        'throughput': len(cities) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'cache_hit_rate': hits / lookups if lookups else 0.0,
+        'upstream_calls': sum(stub.calls.values()),
+        'peak_memory_mb': peak / 2 ** 20,
+    }
+
+def run(args):
+    """Run the cold, warm and concurrent scenarios and return their results"""
+    rng = random.Random(args.seed)
+    cities = [f"Benchmark City {i}" for i in range(args.cities)]
+    stub = StubOpenWeatherMap(latency=args.latency, jitter=args.jitter, slow_rate=args.slow_rate,
+                              slow_latency=args.slow_latency, error_rate=args.error_rate, seed=args.seed)
+    options = {'with_render': not args.no_render, 'trace_memory': not args.no_trace_memory}
+    results = []
+    with stub:
+        # Like the app, the decoded store and the rendered views live as long as the service
+        service = make_service(stub, args)
+        store, views = WeatherStore(), RenderCache()
+        try:
+            # Cold: every city is fetched from the stub for the first time
+            results.append(run_scenario('cold', service, store, views, stub, cities, 1, **options))
+            # Warm: the same cities again, answered from the cache
+            results.append(run_scenario('warm', service, store, views, stub, cities, 1, **options))
+        finally:
+            service.close()
+        
+        # Concurrent: many sessions asking for a skewed mix of cities at once on a cold cache
+        service = make_service(stub, args)
+        try:
+            hot = cities[:max(1, len(cities) // 10)]
+            mixed = [rng.choice(hot) if rng.random() < 0.8 else rng.choice(cities) for _ in range(args.requests)]
+            results.append(run_scenario('concurrent', service, WeatherStore(), RenderCache(), stub, mixed,
+                                        args.concurrency, **options))
+        finally:
+            service.close()
+    return results
+
+def format_table(results):
+    columns = (('scenario', ''), ('operations', 'd'), ('errors', 'd'), ('throughput', '.1f'),
+               ('p50_ms', '.1f'), ('p95_ms', '.1f'), ('p99_ms', '.1f'), ('cache_hit_rate', '.1%'),
+               ('upstream_calls', 'd'), ('peak_memory_mb', '.1f'))
+    lines = [' '.join(f"{name:>14}" for name, _ in columns)]
+    for result in results:
+        lines.append(' '.join(f"{result[name]:>14{spec}}" for name, spec in columns))
+    return '\n'.join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark WeatherService against a local stub API")
+    parser.add_argument("--cities", type=int, default=100, help="distinct cities in the cold and warm runs")
+    parser.add_argument("--requests", type=int, default=1000, help="requests in the concurrent run")
+    parser.add_argument("--concurrency", type=int, default=16, help="threads in the concurrent run")
+    parser.add_argument("--latency", type=float, default=0.02, help="stub response time in seconds")
+    parser.add_argument("--jitter", type=float, default=0.01, help="extra random stub delay in seconds")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="share of very slow stub responses")
+    parser.add_argument("--slow-latency", type=float, default=1.0, help="delay of a slow response in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of stub responses that fail with 503")
+    parser.add_argument("--hedge-after", default=None,
+                        help='hedge delay in seconds or a latency percentile such as "p95"')
+    parser.add_argument("--no-render", action="store_true", help="skip the forecast aggregation and chart")
+    parser.add_argument("--no-trace-memory", action="store_true",
+                        help="skip peak memory tracing, which slows every allocation")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+    if args.hedge_after is not None and not args.hedge_after.startswith('p'):
+        args.hedge_after = float(args.hedge_after)
+    
+    # st.error outside "streamlit run" only logs bare-mode warnings
+    logging.disable(logging.WARNING)
+    results = run(args)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(format_table(results))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict, namedtuple
+
+# Bounds for one cache namespace; None means unbounded
+CacheLimits = namedtuple('CacheLimits', ['max_entries', 'max_bytes'], defaults=(None, None))
+
+def namespace_of(key):
+    """Return the namespace of a cache key ("weather:51.51,-0.13" -> "weather")"""
+    return key.split(':', 1)[0]
+
+def estimate_size(value):
+    """Approximate in-memory size of a JSON-like value in bytes"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(estimate_size(item) for item in value)
+    return size
+
+class CacheBackend:
+    """Interface for WeatherService cache backends
+    
+    Values are JSON-compatible API payloads. get() returns None for missing or
+    expired entries, so None itself is never stored. Expired entries are kept
+    until purged so callers can serve them while revalidating.
+    
+    Keys look like "<namespace>:<id>" with one namespace per endpoint. limits
+    maps namespaces to CacheLimits; other namespaces use default_limits.
+    Hits, misses and evictions are counted per namespace.
+    """
+    
+    def __init__(self, limits=None, default_limits=CacheLimits()):
+        self.limits = dict(limits or {})
+        self.default_limits = default_limits
+        self._counters = defaultdict(Counter)  # namespace -> hits/misses/evictions
+        self._counters_lock = threading.Lock()
+    
+    def limits_for(self, namespace):
+        """Return the CacheLimits that apply to a namespace"""
+        return self.limits.get(namespace, self.default_limits)
+    
+    def _count(self, namespace, event, n=1):
+        with self._counters_lock:
+            self._counters[namespace][event] += n
+    
+    def stats(self):
+        """Return {namespace: {'entries', 'bytes', 'hits', 'misses', 'evictions'}}"""
+        usage = self._usage()
+        with self._counters_lock:
+            counters = {namespace: dict(counts) for namespace, counts in self._counters.items()}
+        return {
+            namespace: {
+                'entries': usage.get(namespace, (0, 0))[0],
+                'bytes': usage.get(namespace, (0, 0))[1],
+                'hits': counters.get(namespace, {}).get('hits', 0),
+                'misses': counters.get(namespace, {}).get('misses', 0),
+                'evictions': counters.get(namespace, {}).get('evictions', 0),
+            }
+            for namespace in sorted(set(usage) | set(counters))
+        }
+    
+    def _usage(self):
+        """Return {namespace: (entries, bytes)}"""
+        raise NotImplementedError
+    
+    def get(self, key):
+        """Return the cached value, or None if it is missing or expired"""
+        entry = self.get_entry(key)
+        if entry is None or entry[1] <= time.time():
+            return None
+        return entry[0]
+    
+    def get_entry(self, key):
+        """Return (value, expires_at) for key even if expired, or None if missing"""
+        raise NotImplementedError
+    
+    def set(self, key, value, ttl):
+        """Store value under key for ttl seconds"""
+        raise NotImplementedError
+    
+    def delete(self, key):
+        """Remove a single entry"""
+        raise NotImplementedError
+    
+    def clear(self):
+        """Remove all entries"""
+        raise NotImplementedError
+    
+    def purge_expired(self, max_stale=0):
+        """Delete entries expired for more than max_stale seconds and return how many were removed"""
+        raise NotImplementedError
+
+class _MemoryEntry:
+    __slots__ = ('value', 'expires_at', 'size', 'uses')
+    
+    def __init__(self, value, expires_at, size):
+        self.value = value
+        self.expires_at = expires_at
+        self.size = size
+        self.uses = 0
+
+class MemoryCache(CacheBackend):
+    """Thread-safe in-process cache with a TTL per entry and bounded size
+    
+    Each namespace is kept within its max_entries and max_bytes (measured with
+    estimate_size) by evicting the least recently used entry (policy='lru') or
+    the least frequently used one (policy='lfu').
+    """
+    
+    def __init__(self, limits=None, default_limits=CacheLimits(), policy='lru'):
+        super().__init__(limits, default_limits)
+        if policy not in ('lru', 'lfu'):
+            raise ValueError(f"Unknown eviction policy: {policy}")
+        self.policy = policy
+        self._namespaces = defaultdict(OrderedDict)  # namespace -> key -> _MemoryEntry, least recent first
+        self._bytes = Counter()  # namespace -> estimated bytes
+        self._lock = threading.Lock()
+    
+    def get_entry(self, key):
+        """Return (value, expires_at) for key even if expired, or None if missing"""
+        namespace = namespace_of(key)
+        with self._lock:
+            entries = self._namespaces.get(namespace)
+            entry = entries.get(key) if entries else None
+            if entry is not None:
+                entries.move_to_end(key)
+                entry.uses += 1
+        self._count(namespace, 'hits' if entry is not None else 'misses')
+        return (entry.value, entry.expires_at) if entry is not None else None
+    
+    def set(self, key, value, ttl):
+        """Store value under key for ttl seconds, evicting other entries if the namespace is full"""
+        namespace = namespace_of(key)
+        limits = self.limits_for(namespace)
+        size = estimate_size(value)
+        if limits.max_bytes is not None and size > limits.max_bytes:
+            return  # Would not fit even in an empty namespace
+        
+        evicted = 0
+        with self._lock:
+            entries = self._namespaces[namespace]
+            old = entries.pop(key, None)
+            if old is not None:
+                self._bytes[namespace] -= old.size
+            entries[key] = _MemoryEntry(value, time.time() + ttl, size)
+            self._bytes[namespace] += size
+            
+            while len(entries) > 1 and (
+                (limits.max_entries is not None and len(entries) > limits.max_entries)
+                or (limits.max_bytes is not None and self._bytes[namespace] > limits.max_bytes)
+            ):
+                victim = self._victim(entries, key)
+                self._bytes[namespace] -= entries.pop(victim).size
+                evicted += 1
+        if evicted:
+            self._count(namespace, 'evictions', evicted)
+    
+    def _victim(self, entries, new_key):
+        """Pick the key to evict from a namespace, never the entry just written"""
+        if self.policy == 'lru':
+            return next(key for key in entries if key != new_key)
+        # Fewest uses first; min() keeps the first of equals, i.e. the least recently used
+        return min((key for key in entries if key != new_key), key=lambda key: entries[key].uses)
+    
+    def delete(self, key):
+        """Remove a single entry"""
+        namespace = namespace_of(key)
+        with self._lock:
+            entries = self._namespaces.get(namespace)
+            entry = entries.pop(key, None) if entries else None
+            if entry is not None:
+                self._bytes[namespace] -= entry.size
+    
+    def clear(self):
+        """Remove all entries"""
+        with self._lock:
+            self._namespaces.clear()
+            self._bytes.clear()
+    
+    def purge_expired(self, max_stale=0):
+        """Delete entries expired for more than max_stale seconds and return how many were removed"""
+        cutoff = time.time() - max_stale
+        removed = 0
+        with self._lock:
+            for namespace, entries in self._namespaces.items():
+                expired = [key for key, entry in entries.items() if entry.expires_at <= cutoff]
+                for key in expired:
+                    self._bytes[namespace] -= entries.pop(key).size
+                removed += len(expired)
+        return removed
+    
+    def _usage(self):
+        """Return {namespace: (entries, bytes)}"""
+        with self._lock:
+            return {namespace: (len(entries), self._bytes[namespace])
+                    for namespace, entries in self._namespaces.items() if entries}
+
+class SQLiteCache(CacheBackend):
+    """Persistent cache in a SQLite file, shared by threads and processes
+    
+    Entries survive restarts, so a freshly started server is served from the
+    previous process's responses until their TTL runs out. WAL journaling lets
+    several server processes read while one writes. A namespace over its
+    limits drops its least recently stored entries; sizes are measured as the
+    length of the stored JSON.
+    """
+    
+    def __init__(self, path="weather_cache.sqlite3", timeout=5.0, limits=None, default_limits=CacheLimits()):
+        super().__init__(limits, default_limits)
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()  # sqlite3 connections are per thread
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "stored_at REAL NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_expires_at ON cache (expires_at)")
+    
+    def _connect(self):
+        """Return this thread's connection, opening it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout)
+            conn.execute(f"PRAGMA busy_timeout={int(self.timeout * 1000)}")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+    
+    def get_entry(self, key):
+        """Return (value, expires_at) for key even if expired, or None if missing"""
+        row = self._connect().execute(
+            "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        self._count(namespace_of(key), 'hits' if row else 'misses')
+        return (json.loads(row[0]), row[1]) if row else None
+    
+    def set(self, key, value, ttl):
+        """Store value under key for ttl seconds, evicting other entries if the namespace is full"""
+        namespace = namespace_of(key)
+        limits = self.limits_for(namespace)
+        payload = json.dumps(value, separators=(',', ':'))
+        if limits.max_bytes is not None and len(payload) > limits.max_bytes:
+            return
+        
+        now = time.time()
+        evicted = 0
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, stored_at, expires_at) VALUES (?, ?, ?, ?)",
+                (key, payload, now, now + ttl)
+            )
+            if limits.max_entries is not None or limits.max_bytes is not None:
+                evicted = self._evict(conn, namespace, limits, key)
+        if evicted:
+            self._count(namespace, 'evictions', evicted)
+    
+    def _evict(self, conn, namespace, limits, new_key):
+        """Delete the least recently stored entries until a namespace fits its limits"""
+        # "ns:" <= key < "ns;" selects the namespace through the primary key index
+        low, high = f"{namespace}:", f"{namespace};"
+        entries, size = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM cache WHERE key >= ? AND key < ?",
+            (low, high)
+        ).fetchone()
+        
+        def over():
+            return ((limits.max_entries is not None and entries > limits.max_entries)
+                    or (limits.max_bytes is not None and size > limits.max_bytes))
+        
+        victims = []
+        if over():
+            rows = conn.execute(
+                "SELECT key, LENGTH(value) FROM cache WHERE key >= ? AND key < ? AND key != ? ORDER BY stored_at",
+                (low, high, new_key)
+            ).fetchall()
+            for victim, victim_size in rows:
+                if not over():
+                    break
+                victims.append((victim,))
+                entries -= 1
+                size -= victim_size
+            conn.executemany("DELETE FROM cache WHERE key = ?", victims)
+        return len(victims)
+    
+    def delete(self, key):
+        """Remove a single entry"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+    
+    def clear(self):
+        """Remove all entries"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM cache")
+    
+    def purge_expired(self, max_stale=0):
+        """Delete entries expired for more than max_stale seconds and return how many were removed"""
+        with self._connect() as conn:
+            return conn.execute(
+                "DELETE FROM cache WHERE expires_at <= ?", (time.time() - max_stale,)
+            ).rowcount
+    
+    def _usage(self):
+        """Return {namespace: (entries, bytes)}"""
+        rows = self._connect().execute(
+            "SELECT substr(key, 1, instr(key, ':') - 1), COUNT(*), SUM(LENGTH(value)) FROM cache GROUP BY 1"
+        ).fetchall()
+        return {namespace: (entries, size) for namespace, entries, size in rows}
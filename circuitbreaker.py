@@ -0,0 +1,98 @@
+import threading
+import time
+import requests
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised instead of calling an endpoint whose circuit is open"""
+
+class CircuitBreaker:
+    """Stop calling an endpoint after repeated failures, then probe for recovery
+    
+    After failure_threshold consecutive failures the circuit opens and calls
+    fail immediately with CircuitOpenError. Once reset_timeout seconds have
+    passed it is half-open: up to half_open_calls probe calls go through, and
+    the first success closes the circuit while a failure opens it again.
+    """
+    
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0, half_open_calls=1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_calls = half_open_calls
+        self.state = CLOSED
+        self.failures = 0  # consecutive failures
+        self.trips = 0  # times the circuit opened
+        self._opened_at = 0.0
+        self._probes = 0  # half-open calls in flight
+        self._lock = threading.Lock()
+    
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go through now"""
+        with self._lock:
+            if self.state == OPEN:
+                retry_in = self._opened_at + self.reset_timeout - time.monotonic()
+                if retry_in > 0:
+                    raise CircuitOpenError(f"{self.name} is unavailable, retrying in {retry_in:.0f}s")
+                self.state = HALF_OPEN
+                self._probes = 0
+            if self.state == HALF_OPEN:
+                if self._probes >= self.half_open_calls:
+                    raise CircuitOpenError(f"{self.name} is unavailable, recovery check in progress")
+                self._probes += 1
+    
+    def release(self):
+        """Give back a call slot for a call that never reached the endpoint"""
+        with self._lock:
+            if self.state == HALF_OPEN and self._probes:
+                self._probes -= 1
+    
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._probes = 0
+    
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.trips += 1
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+                self._probes = 0
+
+class CircuitBreakers:
+    """One CircuitBreaker per endpoint, created on first use with shared settings"""
+    
+    def __init__(self, **settings):
+        self.settings = settings
+        self._breakers = {}
+        self._lock = threading.Lock()
+    
+    def get(self, name):
+        """Return the breaker for an endpoint"""
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                breaker = self._breakers[name] = CircuitBreaker(name, **self.settings)
+            return breaker
+    
+    def is_open(self, name):
+        """Return True if calls to an endpoint are currently being refused"""
+        with self._lock:
+            breaker = self._breakers.get(name)
+        return breaker is not None and breaker.state != CLOSED
+    
+    def stats(self):
+        """Return {endpoint: {'state', 'failures', 'trips'}}"""
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {
+            breaker.name: {'state': breaker.state, 'failures': breaker.failures, 'trips': breaker.trips}
+            for breaker in breakers
+        }
@@ -0,0 +1,100 @@
+import numpy as np
+
+# Candidates kept per output point by the min/max preselection in downsample_indices
+MINMAX_RATIO = 4
+
+def _fill_gaps(x, y):
+    """Return y with NaN values linearly interpolated from their finite neighbours"""
+    missing = np.isnan(y)
+    if not missing.any():
+        return y
+    if missing.all():
+        return np.zeros_like(y)
+    return np.where(missing, np.interp(x, x[~missing], y[~missing]), y)
+
+def _bucket_edges(n, n_out):
+    """Return the start of each of the n_out - 2 buckets between the first and last of n points, then n - 1"""
+    return np.linspace(1, n - 1, n_out - 1).astype('int64')
+
+def lttb_indices(x, y, n_out):
+    """Return the indices of n_out points chosen by Largest-Triangle-Three-Buckets
+    
+    The first and last points are always kept; every bucket in between keeps
+    the point forming the largest triangle with the point kept before it and
+    the average of the next bucket. That favours visually prominent points but
+    one per bucket cannot keep both a bucket's minimum and maximum, so
+    extremes may be dropped; see downsample_indices. x must be increasing.
+    """
+    x = np.asarray(x, dtype='float64')
+    y = _fill_gaps(x, np.asarray(y, dtype='float64'))
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    
+    # n_out - 2 buckets over the points between the first and the last
+    edges = _bucket_edges(n, n_out)
+    counts = np.diff(np.append(edges, n))
+    mean_x = np.add.reduceat(x, edges) / counts
+    mean_y = np.add.reduceat(y, edges) / counts
+    
+    indices = np.empty(n_out, dtype='int64')
+    indices[0] = 0
+    indices[-1] = n - 1
+    previous = 0
+    for bucket in range(n_out - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        # mean_x/mean_y[bucket + 1] average the next bucket, or are the last point
+        next_x, next_y = mean_x[bucket + 1], mean_y[bucket + 1]
+        # Twice the triangle area; the constant factor does not change the argmax
+        areas = np.abs((x[previous] - next_x) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(areas.argmax())
+        indices[bucket + 1] = previous
+    return indices
+
+def minmax_indices(y, n_out):
+    """Return sorted indices keeping the minimum and maximum of each of n_out // 2 buckets"""
+    y = np.asarray(y, dtype='float64')
+    n = len(y)
+    buckets = n_out // 2
+    if n_out >= n or buckets < 1:
+        return np.arange(n)
+    y = _fill_gaps(np.arange(n, dtype='float64'), y)
+    # Equal-sized buckets as rows of a matrix; the remainder goes to a last, shorter bucket
+    size = n // buckets
+    full = y[:size * buckets].reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+    lows = offsets + full.argmin(axis=1)
+    highs = offsets + full.argmax(axis=1)
+    rest = y[size * buckets:]
+    if len(rest):
+        lows = np.append(lows, size * buckets + rest.argmin())
+        highs = np.append(highs, size * buckets + rest.argmax())
+    return np.unique(np.concatenate([lows, highs]))
+
+def downsample_indices(x, y, n_out):
+    """Return the sorted indices of at most n_out points that keep the shape of a long series
+    
+    Long series are first reduced to the minima and maxima of MINMAX_RATIO *
+    n_out buckets. The candidates are then split into (n_out - 2) // 3
+    buckets, each keeping its minimum and maximum as well as the point LTTB
+    picks for it (as in M4), so every bucket's extremes, and with them the
+    series' minimum and maximum, are kept and the cost stays close to linear.
+    """
+    n = len(x)
+    if n <= n_out:
+        return np.arange(n)
+    candidates = np.arange(n)
+    if n > MINMAX_RATIO * n_out:
+        candidates = np.union1d(minmax_indices(y, MINMAX_RATIO * n_out), [0, n - 1])
+    x = np.asarray(x, dtype='float64')[candidates]
+    y = _fill_gaps(x, np.asarray(y, dtype='float64')[candidates])
+    buckets = (n_out - 2) // 3
+    if buckets < 1:
+        return candidates[lttb_indices(x, y, n_out)]
+    
+    edges = _bucket_edges(len(x), buckets + 2)
+    picks = [lttb_indices(x, y, buckets + 2)]
+    for start, end in zip(edges[:-1], edges[1:]):
+        picks.append([start + y[start:end].argmin(), start + y[start:end].argmax()])
+    return candidates[np.unique(np.concatenate(picks))]
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+
+class ForecastFrame:
+    """Columnar view of a 5-day/3-hour forecast response, built once per response
+    
+    Timestamps are converted to the forecast city's local wall-clock time
+    using the response's timezone offset, so daily grouping and chart labels
+    follow the city's calendar rather than the server's. digest identifies
+    the response's content, so views built from the frame can be reused.
+    """
+    
+    def __init__(self, forecast_data, digest=None):
+        items = forecast_data.get('list', [])
+        self.tz_offset = forecast_data.get('city', {}).get('timezone', 0)
+        self.digest = digest
+        self._daily = None
+        
+        timestamps = np.fromiter((item['dt'] for item in items), dtype='int64', count=len(items))
+        self.df = pd.DataFrame({
+            'time': pd.to_datetime(timestamps + self.tz_offset, unit='s'),
+            'temperature': np.fromiter((item['main']['temp'] for item in items), dtype='float64', count=len(items)),
+            'feels_like': np.fromiter((item['main']['feels_like'] for item in items), dtype='float64', count=len(items)),
+            'humidity': np.fromiter((item['main'].get('humidity', np.nan) for item in items), dtype='float64', count=len(items)),
+            'wind_speed': np.fromiter((item.get('wind', {}).get('speed', np.nan) for item in items), dtype='float64', count=len(items)),
+            'icon': pd.Categorical([item['weather'][0]['icon'] for item in items]),
+            'description': pd.Categorical([item['weather'][0]['description'] for item in items]),
+        })
+    
+    def __len__(self):
+        return len(self.df)
+    
+    def head(self, n):
+        """Return a ForecastFrame limited to the first n time slots"""
+        frame = ForecastFrame.__new__(ForecastFrame)
+        frame.tz_offset = self.tz_offset
+        frame.digest = f"{self.digest}:{n}" if self.digest else None
+        frame._daily = None
+        frame.df = self.df.iloc[:n]
+        return frame
+    
+    def window(self, start=None, end=None):
+        """Return a ForecastFrame limited to local times from start up to and including end"""
+        times = self.df['time']
+        first = times.searchsorted(pd.Timestamp(start), side='left') if start is not None else 0
+        last = times.searchsorted(pd.Timestamp(end), side='right') if end is not None else len(times)
+        frame = ForecastFrame.__new__(ForecastFrame)
+        frame.tz_offset = self.tz_offset
+        frame.digest = f"{self.digest}:{first}-{last}" if self.digest else None
+        frame._daily = None
+        frame.df = self.df.iloc[first:last]
+        return frame
+    
+    @property
+    def times(self):
+        return self.df['time']
+    
+    @property
+    def temperatures(self):
+        return self.df['temperature'].to_numpy()
+    
+    @property
+    def feels_like(self):
+        return self.df['feels_like'].to_numpy()
+    
+    def daily(self):
+        """Aggregate slots per local calendar day
+        
+        Returns a DataFrame indexed by date with min_temp, max_temp and the
+        weather description and icon of the day's first slot. The result is
+        computed once per frame and must not be modified.
+        """
+        if self._daily is None:
+            days = self.df['time'].dt.normalize().rename('date')
+            self._daily = self.df.groupby(days, sort=True).agg(
+                min_temp=('temperature', 'min'),
+                max_temp=('temperature', 'max'),
+                weather=('description', 'first'),
+                icon=('icon', 'first'),
+            )
+        return self._daily
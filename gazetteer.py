@@ -0,0 +1,135 @@
+import gzip
+import heapq
+import io
+import os
+import sys
+import unicodedata
+import zipfile
+from array import array
+from bisect import bisect_left
+
+# Column positions in the GeoNames "cities" dumps (cities500/1000/5000/15000.txt)
+GEONAMES_NAME = 1
+GEONAMES_ASCII_NAME = 2
+GEONAMES_LATITUDE = 4
+GEONAMES_LONGITUDE = 5
+GEONAMES_COUNTRY = 8
+GEONAMES_ADMIN1 = 10
+GEONAMES_POPULATION = 14
+
+# Prefixes up to this length have their top results precomputed, because they
+# match too many names to rank on every keystroke
+SHORT_PREFIX_LENGTH = 2
+
+def fold(text):
+    """Lowercase and strip accents so "zur" matches "Zürich\""""
+    decomposed = unicodedata.normalize('NFKD', text.strip().lower())
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+def _open_text(path):
+    """Open a plain, gzipped or zipped text file for reading"""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    if path.endswith('.zip'):
+        archive = zipfile.ZipFile(path)
+        member = next(name for name in archive.namelist() if name.endswith('.txt'))
+        return io.TextIOWrapper(archive.open(member), encoding='utf-8')
+    return open(path, encoding='utf-8')
+
+class Gazetteer:
+    """Offline city index for autocomplete, ranked by population
+    
+    Cities are stored column-wise in compact arrays. Lookups use a sorted
+    array of folded names (a flattened trie) searched with bisect. Each city
+    is indexed under its name and its ASCII name.
+    """
+    
+    def __init__(self, names, ascii_names, states, countries, lats, lons, populations):
+        self.names = names
+        self.states = states
+        self.countries = countries
+        self.lats = array('f', lats)
+        self.lons = array('f', lons)
+        self.populations = array('L', populations)
+        
+        index = set()
+        for row, (name, ascii_name) in enumerate(zip(names, ascii_names)):
+            index.add((fold(name), row))
+            index.add((fold(ascii_name), row))
+        index = sorted(index)
+        self._keys = [key for key, _ in index]
+        self._rows = array('L', (row for _, row in index))
+        self._top_short = self._build_short_prefixes()
+    
+    @classmethod
+    def from_geonames(cls, path, admin1_path=None, min_population=0):
+        """Load a GeoNames cities dump (.txt, .gz or .zip)
+        
+        admin1_path optionally points at admin1CodesASCII.txt so results show
+        region names instead of codes.
+        """
+        admin1_names = {}
+        if admin1_path and os.path.exists(admin1_path):
+            with _open_text(admin1_path) as f:
+                for line in f:
+                    fields = line.rstrip('\n').split('\t')
+                    if len(fields) >= 2:
+                        admin1_names[fields[0]] = fields[1]
+        
+        names, ascii_names, states, countries = [], [], [], []
+        lats, lons, populations = [], [], []
+        with _open_text(path) as f:
+            for line in f:
+                fields = line.rstrip('\n').split('\t')
+                if len(fields) <= GEONAMES_POPULATION:
+                    continue
+                population = int(fields[GEONAMES_POPULATION] or 0)
+                if population < min_population:
+                    continue
+                country = fields[GEONAMES_COUNTRY]
+                admin1 = fields[GEONAMES_ADMIN1]
+                names.append(fields[GEONAMES_NAME])
+                ascii_names.append(fields[GEONAMES_ASCII_NAME])
+                # Repeated strings are interned so each is stored once
+                states.append(sys.intern(admin1_names.get(f"{country}.{admin1}", '')))
+                countries.append(sys.intern(country))
+                lats.append(float(fields[GEONAMES_LATITUDE]))
+                lons.append(float(fields[GEONAMES_LONGITUDE]))
+                populations.append(population)
+        
+        return cls(names, ascii_names, states, countries, lats, lons, populations)
+    
+    def __len__(self):
+        return len(self.names)
+    
+    def _match_range(self, prefix):
+        """Return the slice of the sorted index whose keys start with prefix"""
+        start = bisect_left(self._keys, prefix)
+        end = bisect_left(self._keys, prefix + '\U0010ffff', start)
+        return start, end
+    
+    def _top_rows(self, start, end, limit):
+        """Return up to limit distinct rows from an index slice, most populous first"""
+        rows = set(self._rows[start:end])
+        return heapq.nlargest(limit, rows, key=self.populations.__getitem__)
+    
+    def _build_short_prefixes(self, limit=20):
+        """Precompute the most populous matches for every short prefix"""
+        prefixes = {key[:length] for key in self._keys for length in range(1, SHORT_PREFIX_LENGTH + 1)}
+        return {prefix: self._top_rows(*self._match_range(prefix), limit) for prefix in prefixes}
+    
+    def search(self, query, limit=5):
+        """Return up to limit city rows whose name starts with query, most populous first"""
+        prefix = fold(query)
+        if not prefix:
+            return []
+        if len(prefix) <= SHORT_PREFIX_LENGTH and limit <= 20:
+            return self._top_short.get(prefix, [])[:limit]
+        return self._top_rows(*self._match_range(prefix), limit)
+    
+    def suggestions(self, query, limit=5):
+        """Return "Name, State, Country" labels in the same format as WeatherService.search_cities"""
+        return [
+            f"{self.names[row]}, {self.states[row]}, {self.countries[row]}"
+            for row in self.search(query, limit)
+        ]
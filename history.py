@@ -0,0 +1,352 @@
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+OBSERVATION = 'observation'
+FORECAST = 'forecast'
+
+# Columns of the raw rows; times are UTC epoch seconds
+COLUMNS = ('location', 'kind', 'time', 'issued', 'temp', 'feels_like', 'humidity', 'pressure', 'wind_speed', 'icon')
+
+# Rollup resolution -> bucket length in seconds
+ROLLUPS = {'hour': 3600, 'day': 86400}
+
+# Name of a partition's merged file; anything else in a raw partition is an uncompacted part
+COMPACTED = 'data.parquet'
+
+# A compaction lock older than this is assumed to belong to a process that died
+LOCK_TIMEOUT = 3600
+
+def _day(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime('%Y-%m-%d')
+
+def _day_start(day):
+    return int(datetime.strptime(day, '%Y-%m-%d').replace(tzinfo=timezone.utc).timestamp())
+
+def _epoch(value):
+    """Convert a datetime, pandas Timestamp or epoch seconds to epoch seconds"""
+    if isinstance(value, (int, float)):
+        return int(value)
+    stamp = pd.Timestamp(value)
+    if stamp.tzinfo is None:
+        stamp = stamp.tz_localize('UTC')
+    return int(stamp.timestamp())
+
+def _days(start, end):
+    """Yield the UTC day names from start up to (excluding) end, both epoch seconds"""
+    day = start - start % 86400
+    while day < end:
+        yield _day(day)
+        day += 86400
+
+def _row(location, kind, item, issued):
+    main = item.get('main', {})
+    weather = item['weather'][0] if item.get('weather') else {}
+    return (location, kind, int(item['dt']), issued, main.get('temp'), main.get('feels_like'),
+            main.get('humidity'), main.get('pressure'), item.get('wind', {}).get('speed'), weather.get('icon'))
+
+def aggregate(df, resolution):
+    """Pre-aggregate observation rows per location into hour or day buckets"""
+    seconds = ROLLUPS[resolution]
+    df = df.assign(time=df['time'] - df['time'] % seconds)
+    return df.groupby(['location', 'time'], sort=True).agg(
+        count=('temp', 'size'),
+        temp_mean=('temp', 'mean'),
+        temp_min=('temp', 'min'),
+        temp_max=('temp', 'max'),
+        feels_like_mean=('feels_like', 'mean'),
+        humidity_mean=('humidity', 'mean'),
+        pressure_mean=('pressure', 'mean'),
+        wind_speed_mean=('wind_speed', 'mean'),
+        wind_speed_max=('wind_speed', 'max'),
+    ).reset_index()
+
+class HistoryStore:
+    """Append-only, columnar history of observations and forecasts keyed by canonical location
+    
+    Rows are buffered in memory and appended as Parquet part files under
+    raw/date=YYYY-MM-DD/ (UTC day of the observed or forecast time).
+    compact() merges each partition's parts into one file sorted by location
+    and time, so range queries skip other days' partitions and read few row
+    groups, and folds the day's hourly and daily observation rollups into
+    one file per month under rollups/{hour,day}/month=YYYY-MM/, so a year
+    of rollups is a dozen files. It drops raw data after retention_days and
+    hourly rollups (by whole months) after hourly_retention_days; daily
+    rollups are kept unless daily_retention_days is set. Several server
+    processes may append to the same directory; only one compacts at a time.
+    generation changes whenever this process adds, flushes or compacts rows.
+    """
+    
+    def __init__(self, path, retention_days=30, hourly_retention_days=365, daily_retention_days=None,
+                 flush_rows=5000, flush_interval=60, compact_interval=3600):
+        self.path = path
+        self.retention_days = retention_days
+        self.hourly_retention_days = hourly_retention_days
+        self.daily_retention_days = daily_retention_days
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.compact_interval = compact_interval
+        self._buffer = []
+        self.generation = 0
+        self._lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self._stop = threading.Event()
+        os.makedirs(os.path.join(path, 'raw'), exist_ok=True)
+    
+    def add_observation(self, location, data, fetched_at=None):
+        """Record a current-weather response for a location"""
+        if data and 'dt' in data:
+            self._append([_row(location, OBSERVATION, data, int(fetched_at or time.time()))])
+    
+    def add_forecast(self, location, data, fetched_at=None):
+        """Record every slot of a forecast response, issued at fetched_at"""
+        issued = int(fetched_at or time.time())
+        self._append([_row(location, FORECAST, item, issued) for item in (data or {}).get('list', []) if 'dt' in item])
+    
+    def _append(self, rows):
+        with self._lock:
+            self._buffer.extend(rows)
+            self.generation += 1
+            full = len(self._buffer) >= self.flush_rows
+        if full:
+            # History must never fail the fetch that produced it
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Writing weather history failed")
+    
+    def flush(self):
+        """Append buffered rows to their partitions as new part files, returning how many were written"""
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+        if not rows:
+            return 0
+        df = pd.DataFrame(rows, columns=COLUMNS)
+        days = (df['time'] - df['time'] % 86400).map(_day)
+        for day, part in df.groupby(days):
+            directory = self._partition('raw', day)
+            os.makedirs(directory, exist_ok=True)
+            name = f"part-{time.time_ns()}-{uuid.uuid4().hex[:8]}.parquet"
+            self._write(part.sort_values(['location', 'time']), os.path.join(directory, name))
+        with self._lock:
+            self.generation += 1
+        return len(rows)
+    
+    def _partition(self, level, day):
+        return os.path.join(self.path, *level.split('/'), f"date={day}")
+    
+    def _rollup_file(self, resolution, month):
+        return os.path.join(self.path, 'rollups', resolution, f"month={month}", COMPACTED)
+    
+    @staticmethod
+    def _write(df, path):
+        """Write a DataFrame to path atomically, so readers never see a partial file"""
+        temporary = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+        df.to_parquet(temporary, index=False)
+        os.replace(temporary, path)
+    
+    @staticmethod
+    def _files(directory):
+        try:
+            return sorted(name for name in os.listdir(directory) if name.endswith('.parquet'))
+        except FileNotFoundError:
+            return []
+    
+    def _read(self, directory, filters=None):
+        """Read every file of a partition, or None if it has no rows"""
+        for attempt in range(2):
+            try:
+                frames = [pd.read_parquet(os.path.join(directory, name), filters=filters)
+                          for name in self._files(directory)]
+                break
+            except FileNotFoundError:
+                # Compacted while reading; the merged file replaces the parts
+                if attempt:
+                    raise
+        frames = [frame for frame in frames if len(frame)]
+        return pd.concat(frames, ignore_index=True) if frames else None
+    
+    def query(self, location, start, end, kind=OBSERVATION):
+        """Return a location's raw rows with start <= time < end, oldest first
+        
+        Times are returned as UTC datetimes. Only the partitions of the days
+        in the range are read, and buffered rows are included.
+        """
+        start, end = _epoch(start), _epoch(end)
+        filters = [('location', '==', location), ('kind', '==', kind), ('time', '>=', start), ('time', '<', end)]
+        frames = [self._read(self._partition('raw', day), filters) for day in _days(start, end)]
+        with self._lock:
+            buffered = [row for row in self._buffer
+                        if row[0] == location and row[1] == kind and start <= row[2] < end]
+        if buffered:
+            frames.append(pd.DataFrame(buffered, columns=COLUMNS))
+        frames = [frame for frame in frames if frame is not None]
+        if not frames:
+            return pd.DataFrame(columns=COLUMNS)
+        df = pd.concat(frames, ignore_index=True)
+        if kind == OBSERVATION:
+            df = df.drop_duplicates(['time'], keep='last')
+        df = df.sort_values(['time', 'issued'], ignore_index=True)
+        for column in ('time', 'issued'):
+            df[column] = pd.to_datetime(df[column], unit='s', utc=True)
+        return df
+    
+    def rollup(self, location, start, end, resolution='hour'):
+        """Return a location's hourly or daily observation aggregates with start <= time < end
+        
+        Compacted days are answered from their month's pre-aggregated rollup
+        file; days with parts appended since are aggregated on the fly.
+        Buffered rows are not included until they are flushed.
+        """
+        start, end = _epoch(start), _epoch(end)
+        seconds = ROLLUPS[resolution]
+        start -= start % seconds
+        frames = []
+        compacted = {}  # month -> start times of its days answered from the month's rollup
+        for day in _days(start, end):
+            raw = self._partition('raw', day)
+            if self._files(raw) in ([], [COMPACTED]) and os.path.exists(self._rollup_file(resolution, day[:7])):
+                compacted.setdefault(day[:7], set()).add(_day_start(day))
+                continue
+            frame = self._read(raw, [('location', '==', location), ('kind', '==', OBSERVATION)])
+            if frame is not None:
+                frames.append(aggregate(frame.drop_duplicates(['time'], keep='last'), resolution))
+        for month, days in compacted.items():
+            frame = pd.read_parquet(self._rollup_file(resolution, month),
+                                    filters=[('location', '==', location), ('time', '>=', start), ('time', '<', end)])
+            # Days recompacted since hold newer rows than the month file
+            frames.append(frame[(frame['time'] - frame['time'] % 86400).isin(days)])
+        frames = [frame for frame in frames if len(frame)]
+        if not frames:
+            return pd.DataFrame(columns=['location', 'time', 'count'])
+        df = pd.concat(frames, ignore_index=True)
+        df = df[(df['time'] >= start) & (df['time'] < end)].sort_values('time', ignore_index=True)
+        df['time'] = pd.to_datetime(df['time'], unit='s', utc=True)
+        return df
+    
+    def compact(self, now=None):
+        """Merge part files, refresh rollups and apply retention, returning counts of what was done
+        
+        Returns None without doing anything if another process is compacting.
+        """
+        now = time.time() if now is None else now
+        lock_path = os.path.join(self.path, 'compact.lock')
+        with self._compact_lock:
+            if not self._take_lock(lock_path):
+                return None
+            try:
+                self.flush()
+                return self._compact(now)
+            finally:
+                os.remove(lock_path)
+    
+    @staticmethod
+    def _take_lock(path):
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except FileExistsError:
+            try:
+                stale = time.time() - os.path.getmtime(path) > LOCK_TIMEOUT
+            except FileNotFoundError:
+                stale = False
+            if not stale:
+                return False
+            os.remove(path)
+            return HistoryStore._take_lock(path)
+    
+    def _compact(self, now):
+        counts = {'merged': 0, 'expired': 0}
+        raw_root = os.path.join(self.path, 'raw')
+        for name in sorted(os.listdir(raw_root)):
+            directory = os.path.join(raw_root, name)
+            files = self._files(directory)
+            if not files or files == [COMPACTED]:
+                continue
+            df = self._read(directory)
+            if df is None:
+                continue
+            # Repeated fetches of one observation collapse to the last; forecasts keep each issue
+            observations = df[df['kind'] == OBSERVATION].drop_duplicates(['location', 'time'], keep='last')
+            forecasts = df[df['kind'] == FORECAST].drop_duplicates(['location', 'time', 'issued'], keep='last')
+            merged = pd.concat([observations, forecasts], ignore_index=True)
+            merged = merged.sort_values(['location', 'kind', 'time', 'issued'], ignore_index=True)
+            self._write(merged, os.path.join(directory, COMPACTED))
+            # Rollups are updated while the parts still exist, so readers never see the day missing
+            day = name.split('=', 1)[1]
+            for resolution in ROLLUPS:
+                self._update_rollup(resolution, day, aggregate(observations, resolution))
+            for file in files:
+                if file != COMPACTED:
+                    os.remove(os.path.join(directory, file))
+            counts['merged'] += 1
+        
+        for level, days in (('raw', self.retention_days), ('rollups/hour', self.hourly_retention_days),
+                            ('rollups/day', self.daily_retention_days)):
+            if days is None:
+                continue
+            cutoff = _day(now - days * 86400)
+            root = os.path.join(self.path, *level.split('/'))
+            for name in os.listdir(root) if os.path.isdir(root) else ():
+                # date=YYYY-MM-DD and month=YYYY-MM both compare against the same prefix of the cutoff
+                value = name.split('=', 1)[-1]
+                if '=' in name and value < cutoff[:len(value)]:
+                    shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+                    counts['expired'] += 1
+        with self._lock:
+            self.generation += 1
+        return counts
+    
+    def _update_rollup(self, resolution, day, rows):
+        """Replace one day's rows in its month's rollup file"""
+        path = self._rollup_file(resolution, day[:7])
+        if os.path.exists(path):
+            existing = pd.read_parquet(path)
+            existing = existing[(existing['time'] - existing['time'] % 86400) != _day_start(day)]
+            frames = [frame for frame in (existing, rows) if len(frame)]
+            rows = pd.concat(frames, ignore_index=True) if frames else rows
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._write(rows.sort_values(['location', 'time'], ignore_index=True), path)
+    
+    def stats(self):
+        """Return the number of raw partitions, their files and bytes, and buffered rows"""
+        raw_root = os.path.join(self.path, 'raw')
+        partitions = files = size = 0
+        for name in os.listdir(raw_root):
+            partitions += 1
+            for file in self._files(os.path.join(raw_root, name)):
+                files += 1
+                try:
+                    size += os.path.getsize(os.path.join(raw_root, name, file))
+                except FileNotFoundError:
+                    pass
+        with self._lock:
+            buffered = len(self._buffer)
+        return {'partitions': partitions, 'files': files, 'bytes': size, 'buffered': buffered}
+    
+    def start(self):
+        """Flush every flush_interval and compact every compact_interval seconds in the background"""
+        threading.Thread(target=self._run, name="history", daemon=True).start()
+        return self
+    
+    def stop(self):
+        self._stop.set()
+        self.flush()
+    
+    def _run(self):
+        next_compaction = time.monotonic() + self.compact_interval
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+                if time.monotonic() >= next_compaction:
+                    self.compact()
+                    next_compaction = time.monotonic() + self.compact_interval
+            except Exception:
+                logger.exception("Writing weather history failed")
@@ -0,0 +1,70 @@
+import re
+from collections import namedtuple
+
+# Coordinates are rounded to 2 decimals (about 1 km) for cache keys and requests
+COORD_PRECISION = 2
+
+# Geocoding results are stable, so they are kept for 30 days (misses for 1 day)
+GEOCODE_TTL = 30 * 24 * 3600
+GEOCODE_MISS_TTL = 24 * 3600
+
+class GeocodingError(Exception):
+    """Raised when the geocoder could not be reached or returned an error"""
+
+def normalize_query(query):
+    """Normalize a free-text location query: case, surrounding and repeated whitespace, comma spacing"""
+    query = re.sub(r'\s+', ' ', query.strip().lower())
+    return re.sub(r'\s*,\s*', ',', query).strip(',')
+
+def round_coord(value):
+    """Round a latitude or longitude to the precision used for cache keys"""
+    return round(float(value), COORD_PRECISION)
+
+def coord_key(lat, lon):
+    """Return the canonical key for a pair of coordinates"""
+    return f"{round_coord(lat):.{COORD_PRECISION}f},{round_coord(lon):.{COORD_PRECISION}f}"
+
+class Location(namedtuple('Location', ['name', 'state', 'country', 'lat', 'lon'])):
+    """A geocoded place"""
+    __slots__ = ()
+    
+    @property
+    def key(self):
+        """Canonical key shared by every spelling that resolves to this place"""
+        return coord_key(self.lat, self.lon)
+    
+    @property
+    def params(self):
+        """Query parameters addressing this place by rounded coordinates"""
+        return {'lat': round_coord(self.lat), 'lon': round_coord(self.lon)}
+
+class LocationResolver:
+    """Resolve free-text queries to canonical Locations, geocoding each spelling once
+    
+    geocode(query) must return the upstream geocoding result list (possibly
+    empty) or raise GeocodingError. Results are cached in the given cache
+    backend under the normalized query, so "London ", "london" and
+    "london, gb" share entries with later lookups.
+    """
+    
+    def __init__(self, geocode, cache):
+        self.geocode = geocode
+        self.cache = cache
+    
+    def resolve(self, query):
+        """Return the Location for query, or None if the geocoder has no match"""
+        normalized = normalize_query(query)
+        if not normalized:
+            return None
+        
+        key = f"geo:{normalized}"
+        results = self.cache.get(key)
+        if results is None:
+            results = self.geocode(normalized)
+            self.cache.set(key, results, GEOCODE_TTL if results else GEOCODE_MISS_TTL)
+        
+        if not results:
+            return None
+        match = results[0]
+        return Location(match['name'], match.get('state', ''), match.get('country', ''),
+                        match['lat'], match['lon'])
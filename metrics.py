@@ -0,0 +1,192 @@
+import os
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds of the latency histogram buckets in seconds
+LATENCY_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name -> (type, help) for every metric WeatherService records or exports
+METRICS = {
+    'weather_upstream_request_duration_seconds': ('histogram', "Upstream API call latency"),
+    'weather_upstream_responses_total': ('counter', "Upstream API responses by status code"),
+    'weather_upstream_timeouts_total': ('counter', "Upstream API calls that timed out"),
+    'weather_upstream_errors_total': ('counter', "Upstream API calls that failed without a response"),
+    'weather_upstream_rejected_total': ('counter', "Upstream API calls refused by the rate limiter or circuit breaker"),
+    'weather_upstream_response_bytes_total': ('counter', "Bytes received from the upstream API"),
+    'weather_upstream_not_modified_total': ('counter', "Conditional upstream calls whose response was unchanged"),
+    'weather_cache_requests_total': ('counter', "Cached lookups by result (hit, stale or miss)"),
+    'weather_cache_entries': ('gauge', "Entries in the response cache"),
+    'weather_cache_bytes': ('gauge', "Size of the response cache in bytes"),
+    'weather_cache_evictions_total': ('counter', "Entries evicted from the response cache"),
+    'weather_circuit_open': ('gauge', "1 while an endpoint's circuit breaker refuses calls"),
+    'weather_circuit_trips_total': ('counter', "Times an endpoint's circuit breaker opened"),
+    'weather_rate_limiter_granted_total': ('counter', "Upstream calls allowed by the rate limiter"),
+    'weather_rate_limiter_rejected_total': ('counter', "Upstream calls rejected by the rate limiter"),
+    'weather_rate_limiter_waiting': ('gauge', "Calls queued for a rate limiter token"),
+    'weather_singleflight_collapsed_total': ('counter', "Calls that shared an identical in-flight request"),
+    'weather_hedged_requests_total': ('counter', "Duplicate requests sent to hedge slow calls"),
+    'weather_hedged_wins_total': ('counter', "Hedged duplicates that answered first"),
+}
+
+def _labels(labels):
+    """Turn a dict of labels into the hashable, ordered form used as a key"""
+    return tuple(sorted(labels.items())) if labels else ()
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+class Metrics:
+    """Thread-safe counters and latency histograms, rendered in the Prometheus text format"""
+    
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counters = defaultdict(float)  # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> [count per bucket..., count above, sum]
+        self._lock = threading.Lock()
+    
+    def inc(self, name, labels=None, value=1):
+        """Add value to a counter"""
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] += value
+    
+    def observe(self, name, value, labels=None):
+        """Record one value in a histogram"""
+        key = (name, _labels(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            histogram[bisect_left(self.buckets, value)] += 1
+            histogram[-1] += value
+    
+    def counters(self, name):
+        """Return {labels: value} for every series of a counter, labels being (name, value) pairs"""
+        with self._lock:
+            return {labels: value for (metric, labels), value in self._counters.items() if metric == name}
+    
+    def histograms(self, name):
+        """Return {labels: (count, sum)} for every series of a histogram"""
+        with self._lock:
+            return {labels: (sum(h[:-1]), h[-1]) for (metric, labels), h in self._histograms.items() if metric == name}
+    
+    def quantile(self, name, q, labels=None):
+        """Estimate a quantile of a histogram by interpolating within its buckets"""
+        with self._lock:
+            histogram = self._histograms.get((name, _labels(labels)))
+            if histogram is None:
+                return None
+            counts = histogram[:-1]
+        total = sum(counts)
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        lower = 0.0
+        for upper, count in zip(self.buckets + (None,), counts):
+            if count and seen + count >= rank:
+                if upper is None:
+                    return lower  # beyond the last bucket only the bound is known
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+            lower = upper if upper is not None else lower
+        return lower
+    
+    def render(self, gauges=()):
+        """Return all metrics in the Prometheus text exposition format
+        
+        gauges is an iterable of (name, labels dict, value) samples computed at
+        scrape time, such as cache sizes; they are rendered with the recorded
+        counters and histograms.
+        """
+        samples = defaultdict(list)  # name -> lines
+        with self._lock:
+            counters = list(self._counters.items())
+            histograms = [(key, list(h)) for key, h in self._histograms.items()]
+        for (name, labels), value in counters:
+            samples[name].append(f"{name}{_format_labels(labels)} {value:g}")
+        for name, labels, value in gauges:
+            samples[name].append(f"{name}{_format_labels(_labels(labels))} {value:g}")
+        for (name, labels), histogram in histograms:
+            cumulative = 0
+            for upper, count in zip(self.buckets + (float('inf'),), histogram[:-1]):
+                cumulative += count
+                bound = '+Inf' if upper == float('inf') else f"{upper:g}"
+                samples[name].append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+            samples[name].append(f"{name}_sum{_format_labels(labels)} {histogram[-1]:g}")
+            samples[name].append(f"{name}_count{_format_labels(labels)} {cumulative}")
+        
+        lines = []
+        for name in sorted(samples):
+            kind, help_text = METRICS.get(name, ('untyped', name))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(sorted(samples[name]))
+        return '\n'.join(lines) + '\n'
+
+def write_textfile(path, text):
+    """Atomically replace path with text, for the node_exporter textfile collector"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(temporary, path)
+
+class MetricsExporter:
+    """Expose render() on a local /metrics endpoint and/or write it to a file every interval seconds"""
+    
+    def __init__(self, render, port=None, path=None, interval=15, host='127.0.0.1'):
+        self.render = render
+        self.port = port
+        self.path = path
+        self.interval = interval
+        self.host = host
+        self._server = None
+        self._stop = threading.Event()
+    
+    def start(self):
+        if self.port is not None:
+            self._server = ThreadingHTTPServer((self.host, self.port), self._handler())
+            self._server.daemon_threads = True
+            threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+        if self.path is not None:
+            threading.Thread(target=self._write_periodically, name="metrics-file", daemon=True).start()
+        return self
+    
+    def stop(self):
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+    
+    def _write_periodically(self):
+        while not self._stop.is_set():
+            write_textfile(self.path, self.render())
+            self._stop.wait(self.interval)
+    
+    def _handler(self):
+        render = self.render
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        return Handler
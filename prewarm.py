@@ -0,0 +1,58 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+class HotCityPrewarmer:
+    """Background scheduler that keeps a hot set of cities fresh in the WeatherService cache
+    
+    The hot set is the configured cities plus the most-searched ones. Every
+    interval seconds, each hot city whose current weather or forecast would
+    expire before the next run is fetched again, so users never wait on an
+    expired entry for these cities.
+    """
+    
+    def __init__(self, weather_service, cities=(), top_searched=10, interval=60):
+        self.weather_service = weather_service
+        self.cities = list(cities)
+        self.top_searched = top_searched
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def hot_cities(self):
+        """Return the configured cities followed by the most-searched ones"""
+        searched = self.weather_service.top_searched(self.top_searched) if self.top_searched else []
+        return list(dict.fromkeys(self.cities + searched))
+    
+    def run_once(self):
+        """Refresh every hot city that expires before the next run, returning how many were fetched"""
+        refreshed = 0
+        # Leave a margin so entries are renewed before they expire, not after
+        horizon = self.interval * 1.5
+        for city in self.hot_cities():
+            if self._stop.is_set():
+                break
+            try:
+                if self.weather_service.prewarm_city(city, horizon):
+                    refreshed += 1
+            except Exception:
+                logger.exception("Pre-warming %s failed", city)
+        return refreshed
+    
+    def start(self):
+        """Start the scheduler thread (no-op if already running)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="weather-prewarm", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """Stop the scheduler thread"""
+        self._stop.set()
+    
+    def _run(self):
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(self.interval)
@@ -0,0 +1,104 @@
+import threading
+import time
+from collections import defaultdict, deque
+
+class ProfileStats:
+    """Timings of named rerun phases aggregated over many reruns (and sessions)
+    
+    Each phase keeps its run count, how many runs reused earlier work instead
+    of recomputing it, total and maximum time, and the last window durations
+    for percentiles.
+    """
+    
+    def __init__(self, window=500):
+        self.reruns = 0
+        self._durations = defaultdict(lambda: deque(maxlen=window))
+        self._totals = defaultdict(lambda: {'runs': 0, 'reused': 0, 'total': 0.0, 'max': 0.0})
+        self._order = {}  # phase -> latest position seen in a rerun, for display in script order
+        self._lock = threading.Lock()
+    
+    def record(self, timings):
+        """Add one rerun's [(phase, seconds, reused), ...]"""
+        with self._lock:
+            self.reruns += 1
+            for position, (phase, seconds, reused) in enumerate(timings):
+                totals = self._totals[phase]
+                totals['runs'] += 1
+                totals['reused'] += bool(reused)
+                totals['total'] += seconds
+                totals['max'] = max(totals['max'], seconds)
+                self._durations[phase].append(seconds)
+                self._order[phase] = max(self._order.get(phase, 0), position)
+    
+    def summary(self):
+        """Return one row per phase in script order with counts and times in milliseconds"""
+        with self._lock:
+            rows = []
+            for phase in sorted(self._totals, key=self._order.get):
+                totals = self._totals[phase]
+                durations = sorted(self._durations[phase])
+                rows.append({
+                    'phase': phase,
+                    'runs': totals['runs'],
+                    'reused': totals['reused'],
+                    'recomputed': totals['runs'] - totals['reused'],
+                    'mean_ms': totals['total'] / totals['runs'] * 1000,
+                    'p95_ms': durations[min(len(durations) - 1, int(0.95 * len(durations)))] * 1000,
+                    'max_ms': totals['max'] * 1000,
+                    'total_ms': totals['total'] * 1000,
+                })
+            return rows
+    
+    def reset(self):
+        with self._lock:
+            self.reruns = 0
+            self._durations.clear()
+            self._totals.clear()
+            self._order.clear()
+
+class RerunProfiler:
+    """Times the phases of one run of the Streamlit script
+    
+    Call phase(name) where each part of the script starts; it ends the
+    previous phase. mark_reused() records that the current phase reused
+    earlier work (a cache or store hit) rather than recomputing it. finish()
+    ends the last phase and adds the rerun to stats. When disabled every call
+    is a no-op, as are calls made after finish().
+    """
+    
+    def __init__(self, stats=None, enabled=True):
+        self.stats = stats
+        self.enabled = enabled
+        self.timings = []  # [phase, seconds, reused]
+        self._current = None
+        self._finished = False
+    
+    def phase(self, name, reused=False):
+        """End the current phase and start timing the next one"""
+        if not self.enabled or self._finished:
+            return
+        now = time.perf_counter()
+        if self._current is not None:
+            self._current[1] = now - self._current[1]
+        self._current = [name, now, reused]
+        self.timings.append(self._current)
+    
+    def mark_reused(self, reused=True):
+        """Record whether the current phase reused earlier work"""
+        if self.enabled and self._current is not None:
+            self._current[2] = reused
+    
+    def finish(self):
+        """End the last phase and record the rerun in stats"""
+        if not self.enabled or self._current is None:
+            return
+        self._current[1] = time.perf_counter() - self._current[1]
+        self._current = None
+        self._finished = True
+        if self.stats is not None:
+            self.stats.record(self.timings)
+    
+    @property
+    def total(self):
+        """Seconds from the start of the rerun to the end of its last finished phase"""
+        return sum(seconds for _, seconds, _ in self.timings)
@@ -0,0 +1,175 @@
+import heapq
+import itertools
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+import requests
+
+# Request priorities, most urgent first
+PRIORITY_INTERACTIVE = 0  # user searches and page renders
+PRIORITY_BACKGROUND = 1  # stale-while-revalidate refreshes and pre-warming
+PRIORITY_BULK = 2  # multi-city and batch lookups
+
+# Seconds a request may wait for a token before failing; 0 fails immediately
+DEFAULT_MAX_WAIT = {
+    PRIORITY_INTERACTIVE: 5.0,
+    PRIORITY_BACKGROUND: 2.0,
+    PRIORITY_BULK: 30.0,
+}
+
+# Share of the bucket a call at this priority must leave for more urgent ones.
+# It is kept in the bucket itself, so it holds across processes sharing a path.
+DEFAULT_RESERVE = {
+    PRIORITY_BULK: 0.25,
+}
+
+class RateLimitExceeded(requests.exceptions.RequestException):
+    """Raised when no API call could be made within the allowed wait"""
+
+class RateLimiter:
+    """Token bucket limiting upstream API calls, with waiters served by priority
+    
+    The bucket holds up to burst tokens and refills at calls_per_minute. Each
+    call takes one token; when none is left, callers queue and are served
+    most urgent priority first, then in arrival order. A caller that cannot
+    get a token within its priority's max_wait raises RateLimitExceeded.
+    
+    With a path, the bucket lives in a SQLite file so every server process on
+    the host shares one quota. Waiters are ordered within a process; across
+    processes, a call only takes a token if its priority's reserve share of
+    the bucket is left afterwards, so batch runs cannot drain the tokens
+    interactive requests need.
+    """
+    
+    def __init__(self, calls_per_minute=60, burst=None, path=None, max_wait=None, name="openweathermap",
+                 reserve=None):
+        self.rate = calls_per_minute / 60.0  # tokens per second
+        self.capacity = burst if burst is not None else calls_per_minute
+        self.max_wait = {**DEFAULT_MAX_WAIT, **(max_wait or {})}
+        # Tokens each priority leaves in the bucket, keeping at least one call possible
+        self.reserve = {level: min(share * self.capacity, self.capacity - 1)
+                        for level, share in {**DEFAULT_RESERVE, **(reserve or {})}.items()}
+        self.path = path
+        self.name = name
+        self._tokens = float(self.capacity)
+        self._updated = time.time()
+        self._cond = threading.Condition()
+        self._waiters = []  # heap of (priority, arrival) tickets
+        self._arrivals = itertools.count()
+        self._local = threading.local()
+        self.granted = 0
+        self.rejected = 0
+        self.waited = 0.0  # total seconds spent waiting for tokens
+        if path is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            conn = self._connect()
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limit ("
+                "name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            conn.execute(
+                "INSERT OR IGNORE INTO rate_limit (name, tokens, updated) VALUES (?, ?, ?)",
+                (name, self._tokens, self._updated)
+            )
+    
+    def _connect(self):
+        """Return this thread's connection, opening it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit, so the bucket update below controls its own transaction
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            self._local.conn = conn
+        return conn
+    
+    @contextmanager
+    def priority(self, level):
+        """Make API calls on this thread use level while the block runs"""
+        previous = self.current_priority()
+        self._local.priority = level
+        try:
+            yield
+        finally:
+            self._local.priority = previous
+    
+    def current_priority(self):
+        """Return the priority used by API calls on this thread"""
+        return getattr(self._local, 'priority', PRIORITY_INTERACTIVE)
+    
+    def _refill(self, tokens, updated, now):
+        return min(self.capacity, tokens + max(now - updated, 0) * self.rate)
+    
+    def _take(self, priority):
+        """Take a token for priority, returning 0, or return the seconds until one is available"""
+        now = time.time()
+        needed = 1 + self.reserve.get(priority, 0)
+        if self.path is None:
+            self._tokens = self._refill(self._tokens, self._updated, now)
+            self._updated = now
+            if self._tokens >= needed:
+                self._tokens -= 1
+                return 0
+            return (needed - self._tokens) / self.rate
+        
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            tokens, updated = conn.execute(
+                "SELECT tokens, updated FROM rate_limit WHERE name = ?", (self.name,)
+            ).fetchone()
+            tokens = self._refill(tokens, updated, now)
+            taken = tokens >= needed
+            if taken:
+                tokens -= 1
+            conn.execute("UPDATE rate_limit SET tokens = ?, updated = ? WHERE name = ?",
+                         (tokens, now, self.name))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return 0 if taken else (needed - tokens) / self.rate
+    
+    def acquire(self, priority=None, max_wait=None):
+        """Block until a token is available for an API call at priority
+        
+        priority defaults to the thread's current priority and max_wait to
+        that priority's maximum wait. Raises RateLimitExceeded if the token
+        would not arrive within max_wait seconds.
+        """
+        priority = self.current_priority() if priority is None else priority
+        max_wait = self.max_wait.get(priority, 0) if max_wait is None else max_wait
+        start = time.monotonic()
+        deadline = start + max_wait
+        ticket = (priority, next(self._arrivals))
+        with self._cond:
+            heapq.heappush(self._waiters, ticket)
+            try:
+                while True:
+                    delay = self._take(priority) if self._waiters[0] == ticket else None
+                    if delay == 0:
+                        self.granted += 1
+                        self.waited += time.monotonic() - start
+                        return
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or (delay is not None and delay > remaining):
+                        self.rejected += 1
+                        raise RateLimitExceeded(
+                            f"API rate limit of {self.rate * 60:g} calls per minute reached"
+                        )
+                    # The head waiter sleeps until its token is due; the others until the head changes
+                    self._cond.wait(remaining if delay is None else delay)
+            finally:
+                self._waiters.remove(ticket)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+    
+    def stats(self):
+        """Return counters for granted and rejected calls, queued callers and total wait"""
+        with self._cond:
+            return {
+                'granted': self.granted,
+                'rejected': self.rejected,
+                'waiting': len(self._waiters),
+                'waited_seconds': self.waited,
+            }
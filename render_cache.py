@@ -0,0 +1,53 @@
+import threading
+from collections import OrderedDict
+
+# Units every forecast view is built in, so switching between them is a lookup
+TEMPERATURE_UNITS = ("Celsius", "Fahrenheit")
+
+class RenderCache:
+    """Process-wide memo of forecast views (figures, table rows) shared by every session
+    
+    Views are keyed by the forecast's content digest and a view name. On a
+    miss the view is built for every unit in units at once, so toggling the
+    temperature unit and unrelated reruns reuse the built objects instead of
+    rebuilding them. Cached values are shared and must not be modified. The
+    least recently used views are dropped beyond max_entries.
+    """
+    
+    def __init__(self, units=TEMPERATURE_UNITS, max_entries=256):
+        self.units = tuple(units)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # (digest, view) -> {unit: value}
+        self._lock = threading.Lock()
+    
+    def get(self, digest, view, unit, build):
+        """Return (build(unit), hit) for a forecast, building it for all units on first use
+        
+        hit is True if the view was already cached. Without a digest the
+        content is unknown, so the view is built but not cached.
+        """
+        if digest is None:
+            return build(unit), False
+        key = (digest, view)
+        with self._lock:
+            built = self._entries.get(key)
+            if built is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return built[unit], True
+            self.misses += 1
+        
+        built = {each: build(each) for each in self.units}
+        with self._lock:
+            self._entries[key] = built
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return built[unit], False
+    
+    def stats(self):
+        """Return the number of cached views, hits and misses"""
+        with self._lock:
+            return {'views': len(self._entries), 'hits': self.hits, 'misses': self.misses}
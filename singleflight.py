@@ -0,0 +1,73 @@
+import threading
+
+def request_key(url, params):
+    """Build a single-flight key from a URL and its query parameters
+    
+    The API key is left out and values are compared case- and
+    whitespace-insensitively, matching how the upstream API treats them.
+    """
+    normalized = tuple(sorted(
+        (name, str(value).strip().lower())
+        for name, value in params.items()
+        if name != 'appid'
+    ))
+    return url, normalized
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'waiters')
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one execution
+    
+    The first caller for a key runs the function; callers arriving while it is
+    in flight wait and receive the same result (or exception).
+    """
+    
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executed = 0  # calls that ran the function
+        self.collapsed = 0  # calls that shared another call's result
+    
+    def do(self, key, fn):
+        """Run fn() for key, or wait for the identical call already in flight"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                call.waiters += 1
+                self.collapsed += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+    
+    def stats(self):
+        """Return counters for executed, collapsed and in-flight calls"""
+        with self._lock:
+            return {
+                'executed': self.executed,
+                'collapsed': self.collapsed,
+                'in_flight': len(self._calls),
+            }
@@ -0,0 +1,64 @@
+import math
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in kilometres"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+class SpatialGrid:
+    """Fixed lat/lon grid that snaps coordinates to cells
+    
+    Every point inside a cell shares that cell's cache key, so nearby
+    requests share cached results. resolution is the cell size in degrees
+    (0.1 is about 11 km north-south).
+    """
+    
+    def __init__(self, namespace, resolution=0.1):
+        self.namespace = namespace
+        self.resolution = resolution
+        self._columns = round(360 / resolution)
+    
+    def cell(self, lat, lon):
+        """Return the (row, column) cell containing a point"""
+        row = math.floor((float(lat) + 90) / self.resolution)
+        column = math.floor((float(lon) + 180) / self.resolution) % self._columns
+        return row, column
+    
+    def key(self, cell):
+        """Return the cache key for a cell"""
+        return f"{self.namespace}:{self.resolution}:{cell[0]},{cell[1]}"
+    
+    def center(self, cell):
+        """Return the (lat, lon) centre of a cell, rounded for use in requests"""
+        lat = (cell[0] + 0.5) * self.resolution - 90
+        lon = (cell[1] + 0.5) * self.resolution - 180
+        return round(lat, 4), round(lon, 4)
+    
+    def neighbours(self, lat, lon, max_distance_km):
+        """Return (distance_km, cell) pairs for cells whose centre is within max_distance_km, nearest first
+        
+        The cell containing the point is always included.
+        """
+        row, column = self.cell(lat, lon)
+        lat_cell_km = KM_PER_DEGREE * self.resolution
+        lon_cell_km = lat_cell_km * max(math.cos(math.radians(float(lat))), 0.01)
+        row_span = math.ceil(max_distance_km / lat_cell_km)
+        column_span = min(math.ceil(max_distance_km / lon_cell_km), self._columns // 2)
+        
+        cells = {}
+        for r in range(row - row_span, row + row_span + 1):
+            if r < 0 or r * self.resolution >= 180:
+                continue
+            for c in range(column - column_span, column + column_span + 1):
+                cell = (r, c % self._columns)
+                center_lat, center_lon = self.center(cell)
+                distance = haversine_km(float(lat), float(lon), center_lat, center_lon)
+                if cell == (row, column) or distance <= max_distance_km:
+                    cells[cell] = distance
+        return sorted((distance, cell) for cell, distance in cells.items())
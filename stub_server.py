@@ -0,0 +1,223 @@
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Timestamp all generated data starts from (2024-01-01 00:00 UTC)
+BASE_TIME = 1704067200
+
+def _seed(text):
+    """Stable integer derived from text, so a place always gets the same data"""
+    return int(hashlib.md5(text.lower().encode()).hexdigest()[:8], 16)
+
+def _place(query=None, lat=None, lon=None):
+    """Return (name, lat, lon) for a city query or a coordinate pair"""
+    if query is not None:
+        name = query.split(',')[0].strip().title() or "Unknown"
+        seed = _seed(name)
+        return name, round(seed % 14000 / 100 - 60, 4), round(seed // 14000 % 36000 / 100 - 180, 4)
+    return f"Place {float(lat):.2f},{float(lon):.2f}", float(lat), float(lon)
+
+def current_payload(name, lat, lon):
+    """Current-weather response in the OpenWeatherMap shape"""
+    seed = _seed(name)
+    return {
+        'coord': {'lon': lon, 'lat': lat},
+        'weather': [{'id': 500, 'main': 'Rain', 'description': 'light rain', 'icon': '10d'}],
+        'main': {'temp': seed % 35 - 5 + 0.5, 'feels_like': seed % 35 - 6.5, 'temp_min': seed % 35 - 7,
+                 'temp_max': seed % 35 - 3, 'pressure': 1000 + seed % 30, 'humidity': 40 + seed % 60},
+        'wind': {'speed': seed % 12 + 0.4, 'deg': seed % 360},
+        'dt': BASE_TIME,
+        'sys': {'country': 'XX', 'sunrise': BASE_TIME + 6 * 3600, 'sunset': BASE_TIME + 18 * 3600},
+        'timezone': (seed % 25 - 12) * 3600,
+        'id': seed % 10 ** 7,
+        'name': name,
+        'cod': 200,
+    }
+
+def forecast_payload(name, lat, lon):
+    """5-day/3-hour forecast response with 40 slots"""
+    seed = _seed(name)
+    slots = []
+    for i in range(40):
+        temp = seed % 25 + 6 * ((i % 8) / 4 - 1) ** 2
+        slots.append({
+            'dt': BASE_TIME + i * 3 * 3600,
+            'main': {'temp': temp, 'feels_like': temp - 1.5, 'humidity': 50 + i % 40, 'pressure': 1012},
+            'weather': [{'id': 803, 'main': 'Clouds', 'description': 'broken clouds', 'icon': '04d'}],
+            'wind': {'speed': 2 + i % 5, 'deg': 180},
+            'dt_txt': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(BASE_TIME + i * 3 * 3600)),
+        })
+    return {
+        'cod': '200',
+        'cnt': len(slots),
+        'list': slots,
+        'city': {'id': seed % 10 ** 7, 'name': name, 'coord': {'lat': lat, 'lon': lon},
+                 'country': 'XX', 'timezone': (seed % 25 - 12) * 3600},
+    }
+
+class StubOpenWeatherMap:
+    """Local stand-in for the OpenWeatherMap endpoints used by WeatherService
+    
+    Serves deterministic data for /data/2.5/weather, forecast, group, onecall
+    and air_pollution and /geo/1.0/direct. Every response is delayed by
+    latency seconds plus up to jitter seconds; with probability slow_rate it is
+    delayed by slow_latency instead, and with probability error_rate it fails
+    with error_status. With etags, successful responses carry an ETag and a
+    request whose If-None-Match matches it gets an empty 304 Not Modified.
+    Calls are counted per endpoint.
+    """
+    
+    def __init__(self, latency=0.0, jitter=0.0, slow_rate=0.0, slow_latency=1.0,
+                 error_rate=0.0, error_status=503, seed=None, port=0, etags=True):
+        self.latency = latency
+        self.jitter = jitter
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.etags = etags
+        self.calls = Counter()
+        self.not_modified = Counter()  # endpoint -> 304 responses
+        self._names = {}  # rounded (lat, lon) -> name of a geocoded place
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+    
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+    
+    @property
+    def base_url(self):
+        return f"{self.url}/data/2.5"
+    
+    @property
+    def geo_url(self):
+        return f"{self.url}/geo/1.0"
+    
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-owm", daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+    
+    def reset_calls(self):
+        with self._lock:
+            self.calls.clear()
+            self.not_modified.clear()
+    
+    def _delay_and_outcome(self):
+        """Return (seconds to wait, whether the call fails)"""
+        with self._lock:
+            if self._random.random() < self.slow_rate:
+                delay = self.slow_latency
+            else:
+                delay = self.latency + self._random.random() * self.jitter
+            return delay, self._random.random() < self.error_rate
+    
+    def respond(self, path, params):
+        """Return (status, body) for a request path and its query parameters"""
+        endpoint = path.rsplit('/', 1)[-1]
+        with self._lock:
+            self.calls[endpoint] += 1
+        delay, fail = self._delay_and_outcome()
+        if delay:
+            time.sleep(delay)
+        if fail:
+            return self.error_status, {'cod': self.error_status, 'message': 'injected error'}
+        
+        if endpoint == 'direct':
+            name, lat, lon = _place(params.get('q', ''))
+            with self._lock:
+                self._names[round(lat, 2), round(lon, 2)] = name
+            limit = int(params.get('limit', 1))
+            return 200, [{'name': name, 'lat': lat, 'lon': lon, 'country': 'XX', 'state': ''}][:limit]
+        if endpoint in ('weather', 'forecast'):
+            if 'q' in params:
+                place = _place(params['q'])
+            elif 'lat' in params and 'lon' in params:
+                lat, lon = float(params['lat']), float(params['lon'])
+                with self._lock:
+                    name = self._names.get((round(lat, 2), round(lon, 2)))
+                place = (name, lat, lon) if name else _place(lat=lat, lon=lon)
+            else:
+                return 400, {'cod': 400, 'message': 'Nothing to geocode'}
+            payload = current_payload if endpoint == 'weather' else forecast_payload
+            return 200, payload(*place)
+        if endpoint == 'group':
+            ids = [int(city_id) for city_id in params.get('id', '').split(',') if city_id]
+            items = [dict(current_payload(f"City {city_id}", 0.0, 0.0), id=city_id) for city_id in ids]
+            return 200, {'cnt': len(items), 'list': items}
+        if endpoint == 'onecall':
+            return 200, {'lat': float(params['lat']), 'lon': float(params['lon']), 'alerts': []}
+        if endpoint == 'air_pollution':
+            aqi = _seed(f"{params.get('lat')},{params.get('lon')}") % 5 + 1
+            return 200, {'list': [{'main': {'aqi': aqi}, 'components': {'pm2_5': aqi * 7.5}, 'dt': BASE_TIME}]}
+        return 404, {'cod': '404', 'message': 'Not found'}
+    
+    def _handler(self):
+        stub = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+            # Headers and body go out in separate writes; without this, delayed ACKs add ~40 ms per request
+            disable_nagle_algorithm = True
+            
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                params = {name: values[0] for name, values in parse_qs(parsed.query).items()}
+                status, body = stub.respond(parsed.path, params)
+                data = json.dumps(body).encode()
+                etag = f'"{hashlib.md5(data).hexdigest()}"' if stub.etags and status == 200 else None
+                if etag is not None and self.headers.get('If-None-Match') == etag:
+                    with stub._lock:
+                        stub.not_modified[parsed.path.rsplit('/', 1)[-1]] += 1
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                if etag is not None:
+                    self.send_header('ETag', etag)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        return Handler
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for the OpenWeatherMap API")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.02, help="up to this many extra seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of responses that fail")
+    parser.add_argument("--no-etags", action="store_true", help="send no ETags, so unchanged data is only detected by content")
+    args = parser.parse_args()
+    
+    stub = StubOpenWeatherMap(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, port=args.port,
+                              etags=not args.no_etags)
+    print(f"Serving on {stub.url}; run the app with")
+    print(f"  OPENWEATHERMAP_BASE_URL={stub.base_url} OPENWEATHERMAP_GEO_URL={stub.geo_url} streamlit run app.py")
+    stub._server.serve_forever()
@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+from downsample import downsample_indices
+
+@pytest.mark.parametrize('n', [5000, 8001, 8760, 100000])
+@pytest.mark.parametrize('seed', range(5))
+def test_downsample_keeps_extremes(n, seed):
+    y = np.random.default_rng(seed).normal(size=n).cumsum()
+    indices = downsample_indices(np.arange(n), y, 2000)
+    
+    assert len(indices) <= 2000
+    assert np.all(np.diff(indices) > 0)
+    assert {0, n - 1, int(y.argmin()), int(y.argmax())} <= set(indices.tolist())
+
+def test_downsample_short_series_unchanged():
+    assert downsample_indices(np.arange(10), np.arange(10.0), 20).tolist() == list(range(10))
+
+def test_downsample_ignores_gaps():
+    y = np.random.default_rng(0).normal(size=5000).cumsum()
+    y[100:200] = np.nan
+    indices = downsample_indices(np.arange(5000), y, 500)
+    
+    assert len(indices) <= 500
+    assert {int(np.nanargmin(y)), int(np.nanargmax(y))} <= set(indices.tolist())
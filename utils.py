@@ -1,7 +1,21 @@
+import numpy as np
 import plotly.graph_objects as go
 import plotly.express as px
 from datetime import datetime
 import streamlit as st
+from downsample import downsample_indices
+
+# Series longer than this are drawn with WebGL traces (lines only) instead of SVG
+WEBGL_THRESHOLD = 500
+
+# Series longer than this are downsampled to it, bounding payload size and render time
+MAX_CHART_POINTS = 2000
+
+def convert_temperature(temp_celsius, unit):
+    """Convert a Celsius value or NumPy array to the specified unit"""
+    if unit == "Fahrenheit":
+        return (temp_celsius * 9/5) + 32
+    return temp_celsius
 
 def format_temperature(temp_celsius, unit):
     """Convert temperature from Celsius to the specified unit"""
@@ -44,42 +58,57 @@ def format_date(date_string):
     except:
         return date_string
 
-def create_forecast_chart(data, temp_unit):
-    """Create temperature trend chart using Plotly"""
-    if not data:
+def create_forecast_chart(frame, temp_unit, window=None, max_points=MAX_CHART_POINTS):
+    """Create temperature trend chart from a ForecastFrame using Plotly
+    
+    window optionally limits the chart to a (start, end) range of local times.
+    Series longer than WEBGL_THRESHOLD use WebGL traces, and those longer than
+    max_points are downsampled keeping minima and maxima (LTTB plus M4), so long
+    hourly forecasts or observation history stay cheap to send and draw.
+    """
+    if frame is not None and window is not None:
+        frame = frame.window(*window)
+    if frame is None or len(frame) == 0:
         return None
     
-    # Extract data for plotting
-    times = [item['datetime'] for item in data]
-    temperatures = [item['temperature'] for item in data]
-    feels_like = [item['feels_like'] for item in data]
-    
-    # Convert temperatures if needed
-    if temp_unit == "Fahrenheit":
-        temperatures = [(temp * 9/5) + 32 for temp in temperatures]
-        feels_like = [(temp * 9/5) + 32 for temp in feels_like]
-        unit_symbol = "°F"
-    else:
-        unit_symbol = "°C"
+    # Columns are already arrays in the city's local time
+    return create_trend_chart(frame.times.to_numpy(), frame.temperatures, frame.feels_like, temp_unit,
+                              "Temperature Forecast", max_points)
+
+def create_trend_chart(times, temperatures, feels_like, temp_unit, title, max_points=MAX_CHART_POINTS):
+    """Create a temperature and feels-like line chart from Celsius arrays, as create_forecast_chart does"""
+    if len(times) == 0:
+        return None
+    temperatures = convert_temperature(np.asarray(temperatures, dtype='float64'), temp_unit)
+    feels_like = convert_temperature(np.asarray(feels_like, dtype='float64'), temp_unit)
+    unit_symbol = "°F" if temp_unit == "Fahrenheit" else "°C"
+    
+    # Long series: WebGL lines, each trace reduced to at most max_points
+    webgl = len(times) > WEBGL_THRESHOLD
+    scatter = go.Scattergl if webgl else go.Scatter
+    mode = 'lines' if webgl else 'lines+markers'
+    positions = times.astype('int64')
+    temperature_points = downsample_indices(positions, temperatures, max_points)
+    feels_like_points = downsample_indices(positions, feels_like, max_points)
     
     # Create the plot
     fig = go.Figure()
     
     # Add temperature line
-    fig.add_trace(go.Scatter(
-        x=times,
-        y=temperatures,
-        mode='lines+markers',
+    fig.add_trace(scatter(
+        x=times[temperature_points],
+        y=temperatures[temperature_points],
+        mode=mode,
         name='Temperature',
         line=dict(color='#FF6B6B', width=3),
         marker=dict(size=6)
     ))
     
     # Add feels like line
-    fig.add_trace(go.Scatter(
-        x=times,
-        y=feels_like,
-        mode='lines+markers',
+    fig.add_trace(scatter(
+        x=times[feels_like_points],
+        y=feels_like[feels_like_points],
+        mode=mode,
         name='Feels Like',
         line=dict(color='#4ECDC4', width=2, dash='dash'),
         marker=dict(size=4)
@@ -87,7 +116,7 @@ def create_forecast_chart(data, temp_unit):
     
     # Update layout
     fig.update_layout(
-        title=f'Temperature Forecast ({unit_symbol})',
+        title=f'{title} ({unit_symbol})',
         xaxis_title='Date & Time',
         yaxis_title=f'Temperature ({unit_symbol})',
         hovermode='x unified',
@@ -104,6 +133,18 @@ def create_forecast_chart(data, temp_unit):
     
     return fig
 
+def forecast_daily_view(frame, temp_unit, days=5):
+    """Return the per-day names, dates, icons, descriptions and highs/lows shown for a ForecastFrame"""
+    daily = frame.daily().head(days)
+    return {
+        'day': daily.index.strftime('%A').tolist(),
+        'date': daily.index.strftime('%b %d').tolist(),
+        'icon': daily['icon'].astype(str).map(get_weather_icon).tolist(),
+        'description': daily['weather'].astype(str).str.title().tolist(),
+        'high': [format_temperature(temp, temp_unit) for temp in daily['max_temp']],
+        'low': [format_temperature(temp, temp_unit) for temp in daily['min_temp']],
+    }
+
 def get_air_quality_description(aqi):
     """Get air quality description based on AQI value"""
     if aqi == 1:
@@ -1,32 +1,391 @@
 import requests
+from requests.adapters import HTTPAdapter
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from streamlit.runtime.scriptrunner_utils.script_run_context import SCRIPT_RUN_CONTEXT_ATTR_NAME
+import hashlib
+import math
 import os
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from datetime import datetime, timedelta
 import json
+from cache import CacheLimits, MemoryCache, namespace_of
+from singleflight import SingleFlight, request_key
+from locations import GeocodingError, LocationResolver, normalize_query
+from spatial import SpatialGrid
+from ratelimit import PRIORITY_BACKGROUND, PRIORITY_BULK, RateLimiter, RateLimitExceeded
+from circuitbreaker import CircuitBreakers, CircuitOpenError
+from metrics import Metrics
+
+# Data sets that can be fetched together with get_weather_bundle
+BUNDLE_PARTS = ('current', 'forecast', 'air_quality', 'alerts')
+
+# Upstream endpoint behind each bundle part, for circuit breaker lookups
+PART_ENDPOINTS = {'current': 'weather', 'forecast': 'forecast', 'air_quality': 'air_pollution',
+                  'alerts': 'onecall', '_coord': 'weather'}
+
+SERVICE_UNAVAILABLE = "Weather service is temporarily unavailable"
+
+# Responses retried by _send; 429 is not, as retrying it only deepens a quota overrun
+RETRY_STATUSES = (500, 502, 503, 504)
+
+# Longest Retry-After a retry waits for; a longer one fails the call instead
+MAX_RETRY_DELAY = 10
+
+# Response times kept per endpoint for percentile-based hedge delays
+LATENCY_WINDOW = 200
+MIN_LATENCY_SAMPLES = 20
+
+# Maximum number of city IDs the upstream group endpoint accepts per call
+GROUP_CHUNK_SIZE = 20
+
+# City IDs never change, so the query -> ID mapping is kept for 30 days
+CITY_ID_TTL = 30 * 24 * 3600
+
+# Geocoding suggestions for a query rarely change
+SEARCH_CACHE_TTL = 24 * 3600
+
+# How long the ETag/Last-Modified of a cached response are kept for conditional requests
+VALIDATORS_TTL = 24 * 3600
+
+# Locations tracked for pre-warming; past this the least-searched half is dropped
+SEARCH_COUNTS_LIMIT = 1000
+
+# Cache namespaces whose values are fetched conditionally and carry an upstream body digest
+VALIDATED_NAMESPACES = ('weather', 'forecast')
+
+# Bounds per cache namespace; keys beyond these are evicted least recently used first
+CACHE_LIMITS = {
+    'weather': CacheLimits(max_entries=2000, max_bytes=32 * 2**20),
+    'forecast': CacheLimits(max_entries=500, max_bytes=64 * 2**20),
+    'alerts': CacheLimits(max_entries=2000, max_bytes=16 * 2**20),
+    'air_quality': CacheLimits(max_entries=2000, max_bytes=16 * 2**20),
+    'geo': CacheLimits(max_entries=10000, max_bytes=16 * 2**20),
+    'search': CacheLimits(max_entries=5000, max_bytes=8 * 2**20),
+    'cityid': CacheLimits(max_entries=10000, max_bytes=2 * 2**20),
+    'validators': CacheLimits(max_entries=5000, max_bytes=4 * 2**20),
+}
+
+def _detach_script_run_ctx():
+    """Remove any Streamlit script context from the current thread, so st calls there reach no session"""
+    setattr(threading.current_thread(), SCRIPT_RUN_CONTEXT_ATTR_NAME, None)
 
 class WeatherService:
-    def __init__(self):
+    def __init__(self, pool_connections=4, pool_maxsize=20, max_retries=2, backoff_factor=0.3,
+                 max_workers=8, cache=None, stale_ttl=3600, gazetteer=None, grid_resolution=0.1,
+                 rate_limiter=None, hedge_after=None, hedge_budget=0.05, history=None):
         self.api_key = os.getenv("OPENWEATHERMAP_API_KEY", "your_api_key_here")
-        self.base_url = "https://api.openweathermap.org/data/2.5"
+        self.base_url = os.getenv("OPENWEATHERMAP_BASE_URL", "https://api.openweathermap.org/data/2.5")
+        self.geo_url = os.getenv("OPENWEATHERMAP_GEO_URL", "https://api.openweathermap.org/geo/1.0")
         self.cache_duration = 600  # 10 minutes in seconds
+        self.alerts_cache_duration = 3600  # 1 hour in seconds
+        self.air_quality_cache_duration = 3600  # 1 hour in seconds
+        # Coordinate-based endpoints are cached per grid cell (0.1 degrees is about 11 km)
+        self.alerts_grid = SpatialGrid('alerts', grid_resolution)
+        self.air_quality_grid = SpatialGrid('air_quality', grid_resolution)
+        self.stale_ttl = stale_ttl  # how long past expiry a value may be served while revalidating
+        self.cache = cache if cache is not None else MemoryCache(CACHE_LIMITS)
+        self.gazetteer = gazetteer  # optional offline index used by search_cities
+        self.history = history  # optional HistoryStore receiving every fetched observation and forecast
+        self.search_counts = Counter()  # canonical location key -> searches
+        self._search_names = {}  # canonical location key -> latest query text for it
+        self._refreshing = set()  # keys with a background refresh in flight
+        self._local = threading.local()
+        # Endpoints that keep failing are skipped until they recover
+        self.breakers = CircuitBreakers(failure_threshold=5, reset_timeout=30.0)
+        # Hedging: seconds, or a percentile of observed latency such as "p95"; None disables it
+        self.hedge_after = hedge_after
+        self.hedge_budget = hedge_budget  # hedged calls allowed per upstream call
+        self._latencies = defaultdict(lambda: deque(maxlen=LATENCY_WINDOW))  # endpoint -> seconds
+        self.requests_sent = 0
+        self.hedges_sent = 0
+        self.hedges_won = 0  # hedged calls whose duplicate answered first
+        self.metrics = Metrics()
+        self.single_flight = SingleFlight()
+        # Upstream calls per minute are capped by the API plan (60 on the free tier)
+        self.rate_limiter = rate_limiter if rate_limiter is not None else RateLimiter()
+        self.resolver = LocationResolver(self._geocode, self.cache)
+        self._lock = threading.Lock()
+        # Retries happen in _send so each one takes a rate limiter token
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.session = self._create_session(pool_connections, pool_maxsize)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="weather")
+        # Separate pool so hedged calls never wait behind the callers blocked on them
+        self.hedge_executor = ThreadPoolExecutor(max_workers=pool_maxsize, thread_name_prefix="weather-hedge")
+    
+    def _create_session(self, pool_connections, pool_maxsize):
+        """Create a keep-alive session with a per-host connection pool"""
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,  # number of hosts kept pooled
+            pool_maxsize=pool_maxsize,  # connections kept alive per host
+            max_retries=0  # retried by _send, which rate limits every attempt
+        )
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
     
-    def _make_request(self, endpoint, params):
-        """Make API request with error handling"""
+    def close(self):
+        """Close all pooled connections and worker threads"""
+        self.executor.shutdown(wait=False)
+        self.hedge_executor.shutdown(wait=False)
+        self.session.close()
+    
+    def _submit(self, fn, *args):
+        """Run fn on the worker pool, keeping the caller's Streamlit script context and API priority"""
+        # Attaching the context lets st.error work from worker threads
+        ctx = get_script_run_ctx(suppress_warning=True)
+        priority = self.rate_limiter.current_priority()
+        
+        def run():
+            add_script_run_ctx(threading.current_thread(), ctx)
+            try:
+                with self.rate_limiter.priority(priority):
+                    return fn(*args)
+            finally:
+                # Pool threads are reused; the next task must not report to this session
+                _detach_script_run_ctx()
+        
+        return self.executor.submit(run)
+    
+    def _get_json(self, url, params, timeout=10):
+        """GET url and return (status_code, decoded JSON or None)
+        
+        Concurrent identical requests (same URL and normalized params) share a
+        single upstream call; see single_flight.stats() for how many collapsed.
+        """
+        status_code, data, _ = self._get_conditional(url, params, None, timeout)
+        return status_code, data
+    
+    def _get_conditional(self, url, params, validators, timeout=10):
+        """GET url unless it is unchanged since validators, returning (status_code, data, validators)
+        
+        validators holds the previous response's 'etag', 'last_modified' and body 'digest';
+        304 means unchanged, including a byte-identical body, which is not decoded.
+        """
+        params = dict(params, appid=self.api_key)
+        key = request_key(url, params)
+        if validators:
+            key += (tuple(sorted(validators.items())),)
+        return self.single_flight.do(key, lambda: self._send(url, params, timeout, validators))
+    
+    def _send(self, url, params, timeout, validators=None):
+        """Send one GET request over the pooled session once the rate limiter and circuit breaker allow it
+        
+        Connection errors and 5xx responses are retried, each attempt taking its own token.
+        """
+        endpoint = url.rsplit('/', 1)[-1]
+        labels = {'endpoint': endpoint}
+        breaker = self.breakers.get(endpoint)
         try:
-            params['appid'] = self.api_key
-            response = requests.get(f"{self.base_url}/{endpoint}", params=params, timeout=10)
-            
+            breaker.before_call()
+        except CircuitOpenError:
+            self.metrics.inc('weather_upstream_rejected_total', dict(labels, reason='circuit_open'))
+            raise
+        
+        headers = {}
+        if validators and validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators and validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+        response = error = None
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.rate_limiter.acquire()
+            except RateLimitExceeded:
+                self.metrics.inc('weather_upstream_rejected_total', dict(labels, reason='rate_limited'))
+                if attempt == 0:
+                    breaker.release()
+                    raise
+                break  # keep the previous attempt's outcome
+            try:
+                response, error = self._attempt(endpoint, url, params, timeout, headers), None
+            except requests.exceptions.ConnectionError as e:
+                response, error = None, e
+                delay = self.backoff_factor * 2 ** attempt
+            except BaseException:
+                breaker.record_failure()
+                raise
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    break
+                delay = self._retry_delay(response, attempt)
+                if delay is None:
+                    break
+            if attempt < self.max_retries:
+                time.sleep(delay)
+        
+        if response is None:
+            breaker.record_failure()
+            raise error
+        if response.status_code == 429 or response.status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        
+        if validators is None:
             if response.status_code == 200:
-                return response.json()
-            elif response.status_code == 404:
+                return response.status_code, response.json(), None
+            return response.status_code, None, None
+        if response.status_code == 304:
+            self.metrics.inc('weather_upstream_not_modified_total', dict(labels, reason='not_modified'))
+            return response.status_code, None, validators
+        if response.status_code != 200:
+            return response.status_code, None, validators
+        current = {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'digest': hashlib.blake2b(response.content, digest_size=16).hexdigest(),
+        }
+        if current['digest'] == validators.get('digest'):
+            self.metrics.inc('weather_upstream_not_modified_total', dict(labels, reason='identical'))
+            return 304, None, current
+        return response.status_code, response.json(), current
+    
+    def _attempt(self, endpoint, url, params, timeout, headers):
+        """Send one GET (hedged if enabled) and record its metrics"""
+        labels = {'endpoint': endpoint}
+        started = time.monotonic()
+        try:
+            if self.hedge_after is None:
+                response = self.session.get(url, params=params, timeout=timeout, headers=headers)
+            else:
+                response = self._hedged_get(endpoint, url, params, timeout, headers)
+        except requests.exceptions.Timeout:
+            self.metrics.inc('weather_upstream_timeouts_total', labels)
+            raise
+        except BaseException as e:
+            self.metrics.inc('weather_upstream_errors_total', dict(labels, error=type(e).__name__))
+            raise
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self.requests_sent += 1
+            self._latencies[endpoint].append(elapsed)
+        self.metrics.observe('weather_upstream_request_duration_seconds', elapsed, labels)
+        self.metrics.inc('weather_upstream_responses_total', dict(labels, code=str(response.status_code)))
+        self.metrics.inc('weather_upstream_response_bytes_total', labels, len(response.content))
+        return response
+    
+    def _retry_delay(self, response, attempt):
+        """Return seconds to wait before retrying a failed response, or None if it should not be retried"""
+        delay = self.backoff_factor * 2 ** attempt
+        retry_after = response.headers.get('Retry-After', '').strip()
+        if retry_after.isdigit():
+            delay = max(delay, int(retry_after))
+        return delay if delay <= MAX_RETRY_DELAY else None
+    
+    def _hedge_delay(self, endpoint):
+        """Return how long to wait before hedging a call to endpoint, or None if it should not be hedged"""
+        if not isinstance(self.hedge_after, str):
+            return self.hedge_after
+        with self._lock:
+            samples = sorted(self._latencies[endpoint])
+        if len(samples) < MIN_LATENCY_SAMPLES:
+            return None
+        percentile = float(self.hedge_after.lstrip('p'))
+        return samples[max(math.ceil(percentile / 100 * len(samples)) - 1, 0)]
+    
+    def _hedged_get(self, endpoint, url, params, timeout, headers=None):
+        """GET url, sending a duplicate request if no response arrives within the hedge delay
+        
+        The first answer wins; duplicates stay within hedge_budget and never wait for a token.
+        """
+        delay = self._hedge_delay(endpoint)
+        if delay is None:
+            return self.session.get(url, params=params, timeout=timeout, headers=headers)
+        
+        first = self.hedge_executor.submit(self.session.get, url, params=params, timeout=timeout, headers=headers)
+        done, _ = wait([first], timeout=delay)
+        if done:
+            return first.result()
+        with self._lock:
+            if self.hedges_sent + 1 > self.hedge_budget * self.requests_sent:
+                return first.result()
+            self.hedges_sent += 1
+        try:
+            self.rate_limiter.acquire(max_wait=0)
+        except RateLimitExceeded:
+            with self._lock:
+                self.hedges_sent -= 1
+            return first.result()
+        second = self.hedge_executor.submit(self.session.get, url, params=params, timeout=timeout, headers=headers)
+        
+        pending = {first, second}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            # Prefer a successful response; an error only counts once both have failed
+            for future in sorted(done, key=lambda f: f.exception() is not None):
+                if future.exception() is None or not pending:
+                    if future is second and future.exception() is None:
+                        with self._lock:
+                            self.hedges_won += 1
+                    return future.result()
+    
+    def metrics_text(self):
+        """Return all service metrics in the Prometheus text format"""
+        gauges = []
+        for namespace, stats in self.cache.stats().items():
+            labels = {'namespace': namespace}
+            gauges.append(('weather_cache_entries', labels, stats['entries']))
+            gauges.append(('weather_cache_bytes', labels, stats['bytes']))
+            gauges.append(('weather_cache_evictions_total', labels, stats['evictions']))
+        for endpoint, stats in self.breakers.stats().items():
+            labels = {'endpoint': endpoint}
+            gauges.append(('weather_circuit_open', labels, int(stats['state'] != 'closed')))
+            gauges.append(('weather_circuit_trips_total', labels, stats['trips']))
+        limiter = self.rate_limiter.stats()
+        gauges.append(('weather_rate_limiter_granted_total', None, limiter['granted']))
+        gauges.append(('weather_rate_limiter_rejected_total', None, limiter['rejected']))
+        gauges.append(('weather_rate_limiter_waiting', None, limiter['waiting']))
+        gauges.append(('weather_singleflight_collapsed_total', None, self.single_flight.stats()['collapsed']))
+        hedging = self.hedge_stats()
+        gauges.append(('weather_hedged_requests_total', None, hedging['hedges']))
+        gauges.append(('weather_hedged_wins_total', None, hedging['hedges_won']))
+        return self.metrics.render(gauges)
+    
+    def hedge_stats(self):
+        """Return counters for upstream calls, hedged duplicates and duplicates that answered first"""
+        with self._lock:
+            return {
+                'requests': self.requests_sent,
+                'hedges': self.hedges_sent,
+                'hedges_won': self.hedges_won,
+            }
+    
+    def _make_request(self, endpoint, params, cache_key=None):
+        """Make API request with error handling
+        
+        With cache_key the request is conditional on the value cached there
+        (see _revalidate).
+        """
+        try:
+            url = f"{self.base_url}/{endpoint}"
+            if cache_key is None:
+                status_code, data = self._get_json(url, params)
+            else:
+                status_code, data = self._revalidate(url, params, cache_key)
+            
+            if status_code == 200:
+                return data
+            elif status_code == 404:
                 return None
-            elif response.status_code == 401:
+            elif status_code == 401:
                 st.error("Invalid API key. Please check your OpenWeatherMap API key.")
                 return None
             else:
-                st.error(f"API request failed with status code: {response.status_code}")
+                st.error(f"API request failed with status code: {status_code}")
                 return None
                 
+        except CircuitOpenError:
+            # Failing fast; callers fall back to last-known-good data
+            return None
+        except RateLimitExceeded:
+            st.error("Too many requests right now. Please try again in a moment.")
+            return None
         except requests.exceptions.Timeout:
             st.error("Request timed out. Please try again.")
             return None
@@ -37,29 +396,388 @@ class WeatherService:
             st.error(f"Request failed: {str(e)}")
             return None
     
-    @st.cache_data(ttl=600)  # Cache for 10 minutes
-    def get_current_weather(_self, city):
-        """Get current weather data for a city"""
-        params = {
-            'q': city,
-            'units': 'metric'
+    def _revalidate(self, url, params, key):
+        """GET url conditionally on the response cached under key, returning (status_code, data)
+        
+        An unchanged response returns the cached value, flagged so _store leaves it alone.
+        """
+        validators = self.cache.get(f"validators:{key}")
+        status_code, data, validators = self._get_conditional(url, params, validators or {})
+        if status_code == 304:
+            entry = self.cache.get_entry(key)
+            if entry is None:
+                # Evicted since the validators were stored, so fetch it in full
+                status_code, data, validators = self._get_conditional(url, params, {})
+            else:
+                self._local.unchanged = True
+                status_code, data = 200, entry[0]
+        if status_code == 200 and validators:
+            self.cache.set(f"validators:{key}", validators, VALIDATORS_TTL)
+            self._local.digest = validators['digest']
+        return status_code, data
+    
+    def _response_digest(self, key):
+        """Return the upstream body digest of the value cached under key, or None if unknown"""
+        validators = self.cache.get(f"validators:{key}")
+        return validators['digest'] if validators else None
+    
+    def _cached(self, key, ttl, fetch, force_refresh=False):
+        """Return the cached value for key, calling fetch() and caching its result on a miss
+        
+        Recently expired values are served while refreshed in the background, and
+        last-known-good values when fetching fails (flagged for _call_tracked).
+        """
+        self._local.digest = None
+        if not force_refresh:
+            # Read before the entry, so a concurrent refresh can make it older than the value but never newer
+            digest = self._response_digest(key) if namespace_of(key) in VALIDATED_NAMESPACES else None
+            entry = self.cache.get_entry(key)
+            if entry is not None:
+                value, expires_at = entry
+                now = time.time()
+                if expires_at > now:
+                    self._count_cache_result(key, 'hit')
+                    self._local.digest = digest
+                    return value
+                if now - expires_at < self.stale_ttl:
+                    self._count_cache_result(key, 'stale')
+                    self._local.digest = digest
+                    self._refresh_in_background(key, ttl, fetch)
+                    return value
+        
+        self._count_cache_result(key, 'miss')
+        value = self._store(key, ttl, fetch)
+        if value is None:
+            self._local.digest = None
+            entry = self.cache.get_entry(key)
+            if entry is not None:
+                self._count_cache_result(key, 'stale')
+                self._local.served_stale = True
+                return entry[0]
+        return value
+    
+    def _count_cache_result(self, key, result):
+        self.metrics.inc('weather_cache_requests_total', {'namespace': namespace_of(key), 'result': result})
+    
+    def _call_tracked(self, fn, *args):
+        """Call fn, returning (result, True if any value came from last-known-good data, body digest)
+        
+        The digest is the upstream body digest of the last cached value fn
+        read, or None if it is unknown.
+        """
+        self._local.served_stale = False
+        self._local.digest = None
+        result = fn(*args)
+        return result, self._local.served_stale, self._local.digest
+    
+    def _store(self, key, ttl, fetch):
+        """Call fetch() and cache its result under key"""
+        self._local.unchanged = False
+        value = fetch()
+        # Failed lookups are not cached so the next call retries
+        if value is not None:
+            self.cache.set(key, value, ttl)
+            if not self._local.unchanged:
+                self._record_history(key, value)
+        return value
+    
+    def _record_history(self, key, value):
+        """Append a freshly fetched current weather or forecast to the history store"""
+        if self.history is None:
+            return
+        namespace, _, location = key.partition(':')
+        if namespace == 'weather':
+            self.history.add_observation(location, value)
+        elif namespace == 'forecast':
+            self.history.add_forecast(location, value)
+    
+    def _refresh_in_background(self, key, ttl, fetch):
+        """Refresh key on the worker pool unless a refresh is already running"""
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        
+        def refresh():
+            # Nobody is waiting for a background refresh, so its errors go to no session
+            _detach_script_run_ctx()
+            try:
+                with self.rate_limiter.priority(PRIORITY_BACKGROUND):
+                    self._store(key, ttl, fetch)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+        
+        self.executor.submit(refresh)
+    
+    def record_search(self, city):
+        """Count a user search by location so the most-searched cities can be kept warm
+        
+        Queries that do not resolve to a location (or cannot be resolved right now) are not counted.
+        """
+        try:
+            location = self.resolver.resolve(city)
+        except GeocodingError:
+            return
+        if location is None:
+            return
+        with self._lock:
+            self.search_counts[location.key] += 1
+            self._search_names[location.key] = city
+            if len(self.search_counts) > SEARCH_COUNTS_LIMIT:
+                self.search_counts = Counter(dict(self.search_counts.most_common(SEARCH_COUNTS_LIMIT // 2)))
+                self._search_names = {key: self._search_names[key] for key in self.search_counts}
+    
+    def top_searched(self, n):
+        """Return a query for each of the n most-searched locations"""
+        with self._lock:
+            return [self._search_names[key] for key, _ in self.search_counts.most_common(n)]
+    
+    def prewarm_city(self, city, horizon):
+        """Refresh a city's current weather and forecast if they expire within horizon seconds
+        
+        Returns True if anything was fetched from the API.
+        """
+        key, _ = self._location(city)
+        if key is None:
+            return False
+        
+        refreshed = False
+        deadline = time.time() + horizon
+        with self.rate_limiter.priority(PRIORITY_BACKGROUND):
+            for cache_key, getter in ((f"weather:{key}", self.get_current_weather),
+                                      (f"forecast:{key}", self.get_forecast)):
+                entry = self.cache.get_entry(cache_key)
+                if entry is None or entry[1] <= deadline:
+                    getter(city, force_refresh=True)
+                    refreshed = True
+        return refreshed
+    
+    def get_weather_bundle(self, city, parts=BUNDLE_PARTS, force_refresh=False):
+        """Fetch current weather, forecast, air quality and alerts for a city concurrently
+        
+        Returns one entry per part plus 'errors' (part -> message), 'stale' (parts served
+        from last-known-good data) and 'digests' (upstream body digest per part, where known).
+        """
+        result = {part: None for part in parts}
+        result['errors'] = {}
+        result['stale'] = []
+        result['digests'] = {}
+        
+        futures = {}
+        if 'current' in parts:
+            futures[self._submit(self._call_tracked, self.get_current_weather, city, force_refresh)] = 'current'
+        if 'forecast' in parts:
+            futures[self._submit(self._call_tracked, self.get_forecast, city, force_refresh)] = 'forecast'
+        coord_parts = [part for part in ('air_quality', 'alerts') if part in parts]
+        if coord_parts and not futures:
+            # Coordinates come from the weather responses, so one is always needed
+            futures[self._submit(self._call_tracked, self.get_current_weather, city, force_refresh)] = '_coord'
+        
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                part = futures[future]
+                try:
+                    data, stale, digest = future.result()
+                except Exception as e:
+                    data, stale, digest = None, False, None
+                    result['errors'][part] = str(e)
+                
+                if data is None:
+                    unavailable = self.breakers.is_open(PART_ENDPOINTS[part])
+                    result['errors'].setdefault(part, SERVICE_UNAVAILABLE if unavailable else "No data returned")
+                    continue
+                if part in result:
+                    result[part] = data
+                    if stale:
+                        result['stale'].append(part)
+                    if part in ('current', 'forecast') and digest is not None:
+                        result['digests'][part] = digest
+                
+                if coord_parts and part in ('current', 'forecast', '_coord'):
+                    coord = data.get('coord') or data.get('city', {}).get('coord')
+                    if coord:
+                        if 'air_quality' in coord_parts:
+                            new = self._submit(self._call_tracked, self.get_air_quality, coord['lat'], coord['lon'])
+                            futures[new] = 'air_quality'
+                            pending.add(new)
+                        if 'alerts' in coord_parts:
+                            new = self._submit(self._call_tracked, self.get_weather_alerts, coord['lat'], coord['lon'])
+                            futures[new] = 'alerts'
+                            pending.add(new)
+                        coord_parts = []
+        
+        result['errors'].pop('_coord', None)
+        for part in ('air_quality', 'alerts'):
+            if part in parts and part not in futures.values() and part not in result['errors']:
+                result['errors'][part] = "Location coordinates unavailable"
+        # Counted after the fetch, when the location is already in the resolver cache
+        self.record_search(city)
+        return result
+    
+    def _location(self, city):
+        """Return (canonical key, request params) for a city query, or (None, None) if it does not exist
+        
+        Every spelling of a place resolves to the same key, so cache entries and
+        upstream calls are shared. If the geocoder is unreachable the normalized
+        query text is used instead.
+        """
+        try:
+            location = self.resolver.resolve(city)
+        except GeocodingError:
+            normalized = normalize_query(city)
+            return f"q:{normalized}", {'q': normalized}
+        if location is None:
+            return None, None
+        return location.key, location.params
+    
+    def location_key(self, city):
+        """Return the canonical location key for a city query, or None if it does not exist"""
+        return self._location(city)[0]
+    
+    def _geocode(self, query):
+        """Look up a normalized query with the geocoding API, raising GeocodingError on failure"""
+        try:
+            status_code, matches = self._get_json(f"{self.geo_url}/direct", {'q': query, 'limit': 1}, timeout=5)
+        except requests.exceptions.RequestException as e:
+            raise GeocodingError(str(e)) from e
+        if status_code != 200:
+            raise GeocodingError(f"Geocoding failed with status code: {status_code}")
+        fields = ('name', 'state', 'country', 'lat', 'lon')
+        return [{field: match[field] for field in fields if field in match} for match in matches]
+    
+    def get_current_weather(self, city, force_refresh=False):
+        """Get current weather data for a city (cached for 10 minutes)"""
+        key, params = self._location(city)
+        if key is None:
+            return None
+        return self._cached(f"weather:{key}", self.cache_duration,
+                            lambda: self._fetch_current_weather(key, params), force_refresh)
+    
+    def _fetch_current_weather(self, key, params):
+        """Fetch current weather for a canonical location and remember its city ID"""
+        data = self._make_request('weather', dict(params, units='metric'), cache_key=f"weather:{key}")
+        if data and 'id' in data:
+            self.cache.set(f"cityid:{key}", data['id'], CITY_ID_TTL)
+        return data
+    
+    def get_part(self, part, city, force_refresh=False):
+        """Return (data, upstream body digest or None) of a city's 'current' weather or 'forecast'"""
+        getter = self.get_current_weather if part == 'current' else self.get_forecast
+        data, _, digest = self._call_tracked(getter, city, force_refresh)
+        return data, digest
+    
+    def get_current_weather_many(self, cities, priority=PRIORITY_BULK):
+        """Get current weather for many cities, returning a dict of city -> data (or None)
+        
+        Cities are first resolved to canonical locations, so different
+        spellings of one place are fetched once. Locations whose city ID is
+        already known are fetched through the group endpoint in chunks of
+        GROUP_CHUNK_SIZE; the rest are looked up individually and concurrently.
+        Every result populates the per-location cache. API calls queue behind
+        interactive ones at the given rate limiter priority.
+        """
+        with self.rate_limiter.priority(priority):
+            return self._get_current_weather_many(cities)
+    
+    def _get_current_weather_many(self, cities):
+        unique = list(dict.fromkeys(cities))
+        resolved = [self._submit(self._location, city) for city in unique]
+        cities_by_key = {}
+        for city, future in zip(unique, resolved):
+            key, _ = future.result()
+            if key is not None:
+                cities_by_key.setdefault(key, []).append(city)
+        
+        results = {}
+        known = []
+        unknown = []
+        for key in cities_by_key:
+            cached = self.cache.get(f"weather:{key}")
+            city_id = self.cache.get(f"cityid:{key}") if cached is None else None
+            if cached is not None:
+                results[key] = cached
+            elif city_id is not None:
+                known.append((key, city_id))
+            else:
+                unknown.append(key)
+        
+        group_futures = [
+            self._submit(self._get_weather_group, known[i:i + GROUP_CHUNK_SIZE])
+            for i in range(0, len(known), GROUP_CHUNK_SIZE)
+        ]
+        single_futures = {
+            self._submit(self.get_current_weather, cities_by_key[key][0]): key for key in unknown
         }
         
-        return _self._make_request('weather', params)
+        for future in group_futures:
+            for key, data in future.result().items():
+                if data is None:
+                    # Not returned by the group call, fall back to a single lookup
+                    single_futures[self._submit(self.get_current_weather, cities_by_key[key][0])] = key
+                else:
+                    results[key] = data
+        for future, key in single_futures.items():
+            results[key] = future.result()
+        
+        by_city = {city: results.get(key) for key, names in cities_by_key.items() for city in names}
+        return {city: by_city.get(city) for city in cities}
     
-    @st.cache_data(ttl=600)  # Cache for 10 minutes
-    def get_forecast(_self, city):
-        """Get 5-day weather forecast for a city"""
+    def _get_weather_group(self, locations):
+        """Fetch current weather for (location key, city ID) pairs in one group request"""
+        ids = {city_id for _, city_id in locations}
         params = {
-            'q': city,
+            'id': ','.join(str(city_id) for city_id in sorted(ids)),
             'units': 'metric'
         }
         
-        return _self._make_request('forecast', params)
+        data = self._make_request('group', params)
+        by_id = {item['id']: item for item in (data or {}).get('list', [])}
+        
+        results = {}
+        for key, city_id in locations:
+            item = by_id.get(city_id)
+            if item is not None:
+                self.cache.set(f"weather:{key}", item, self.cache_duration)
+                # The validators belong to the single-location response this replaces
+                self.cache.delete(f"validators:weather:{key}")
+                self._record_history(f"weather:{key}", item)
+            results[key] = item
+        return results
     
-    @st.cache_data(ttl=3600)  # Cache for 1 hour
-    def get_weather_alerts(_self, lat, lon):
-        """Get weather alerts for specific coordinates"""
+    def get_forecast(self, city, force_refresh=False):
+        """Get 5-day weather forecast for a city (cached for 10 minutes)"""
+        key, params = self._location(city)
+        if key is None:
+            return None
+        return self._cached(f"forecast:{key}", self.cache_duration,
+                            lambda: self._make_request('forecast', dict(params, units='metric'),
+                                                       cache_key=f"forecast:{key}"),
+                            force_refresh)
+    
+    def get_weather_alerts(self, lat, lon):
+        """Get weather alerts for specific coordinates (cached per grid cell for 1 hour)
+        
+        Returns [] when there are no alerts or none could be fetched and
+        nothing is cached for the cell.
+        """
+        cell = self.alerts_grid.cell(lat, lon)
+        alerts = self._cached(self.alerts_grid.key(cell), self.alerts_cache_duration,
+                              lambda: self._fetch_weather_alerts(*self.alerts_grid.center(cell)))
+        return alerts if alerts is not None else []
+    
+    def nearest_cached(self, grid, lat, lon, max_distance_km):
+        """Return the fresh cached value of the nearest grid cell within max_distance_km, or None"""
+        for _, cell in grid.neighbours(lat, lon, max_distance_km):
+            value = self.cache.get(grid.key(cell))
+            if value is not None:
+                return value
+        return None
+    
+    def _fetch_weather_alerts(self, lat, lon):
+        """Fetch weather alerts for specific coordinates, or None if the request failed"""
         params = {
             'lat': lat,
             'lon': lon,
@@ -67,73 +785,82 @@ class WeatherService:
         }
         
         try:
-            response = requests.get(
-                "https://api.openweathermap.org/data/2.5/onecall",
-                params=params,
-                timeout=10
-            )
+            status_code, data = self._get_json(f"{self.base_url}/onecall", params)
             
-            if response.status_code == 200:
-                data = response.json()
+            if status_code == 200:
                 return data.get('alerts', [])
             else:
-                return []
+                # Not cached, so _cached keeps serving the last-known-good alerts
+                return None
                 
         except requests.exceptions.RequestException:
-            return []
+            return None
     
     def search_cities(self, query, limit=5):
         """Search for cities with autocomplete suggestions"""
-        # This is a simplified implementation
-        # In a real app, you might want to use a more comprehensive city database
-        # or OpenWeatherMap's geocoding API
+        # The offline gazetteer answers per-keystroke lookups from memory; the
+        # geocoding API is only used when there is no gazetteer or no match
         
         if len(query) < 2:
             return []
         
+        if self.gazetteer is not None:
+            suggestions = self.gazetteer.suggestions(query, limit)
+            if suggestions:
+                return suggestions
+        
+        normalized = normalize_query(query)
+        cached = self.cache.get(f"search:{limit}:{normalized}")
+        if cached is not None:
+            return cached
+        
         # Using geocoding API for city suggestions
         params = {
-            'q': query,
-            'limit': limit,
-            'appid': self.api_key
+            'q': normalized,
+            'limit': limit
         }
         
         try:
-            response = requests.get(
-                "http://api.openweathermap.org/geo/1.0/direct",
-                params=params,
-                timeout=5
-            )
+            status_code, cities = self._get_json(f"{self.geo_url}/direct", params, timeout=5)
             
-            if response.status_code == 200:
-                cities = response.json()
-                return [
+            if status_code == 200:
+                suggestions = [
                     f"{city['name']}, {city.get('state', '')}, {city['country']}"
                     for city in cities
                 ]
+                self.cache.set(f"search:{limit}:{normalized}", suggestions, SEARCH_CACHE_TTL)
+                return suggestions
             else:
                 return []
                 
         except requests.exceptions.RequestException:
             return []
     
-    def get_air_quality(self, lat, lon):
-        """Get air quality data for specific coordinates"""
+    def get_air_quality(self, lat, lon, max_distance_km=25):
+        """Get air quality data for specific coordinates (cached per grid cell for 1 hour)
+        
+        Every point in a grid cell shares one cached result. If the API call
+        fails, the nearest cached cell within max_distance_km is used instead.
+        """
+        cell = self.air_quality_grid.cell(lat, lon)
+        data = self._cached(self.air_quality_grid.key(cell), self.air_quality_cache_duration,
+                            lambda: self._fetch_air_quality(*self.air_quality_grid.center(cell)))
+        if data is None and max_distance_km:
+            data = self.nearest_cached(self.air_quality_grid, lat, lon, max_distance_km)
+        return data
+    
+    def _fetch_air_quality(self, lat, lon):
+        """Fetch air quality data for specific coordinates"""
         params = {
             'lat': lat,
-            'lon': lon,
-            'appid': self.api_key
+            'lon': lon
         }
         
         try:
-            response = requests.get(
-                "http://api.openweathermap.org/data/2.5/air_pollution",
-                params=params,
-                timeout=10
-            )
+            status_code, data = self._get_json(f"{self.base_url}/air_pollution", params)
             
-            if response.status_code == 200:
-                return response.json()
+            if status_code == 200:
+                return data
             else:
                 return None
                 
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import sys
+import threading
+from collections import OrderedDict, namedtuple
+from forecast_frame import ForecastFrame
+
+# What a session keeps in st.session_state instead of the decoded payloads
+WeatherHandle = namedtuple('WeatherHandle', ['key', 'version'])
+
+def content_digest(data):
+    """Return a short digest of a JSON payload's content, independent of key order"""
+    encoded = json.dumps(data, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+class CurrentConditions:
+    """Compact record of the current-weather fields the dashboard displays"""
+    __slots__ = ('name', 'country', 'temp', 'feels_like', 'humidity', 'pressure',
+                 'wind_speed', 'sunrise', 'sunset', 'timezone', 'description', 'icon', 'dt')
+    
+    def __init__(self, data):
+        main = data['main']
+        weather = data['weather'][0] if data.get('weather') else {}
+        self.name = sys.intern(data['name'])
+        self.country = sys.intern(data['sys'].get('country', ''))
+        self.temp = float(main['temp'])
+        self.feels_like = float(main['feels_like'])
+        self.humidity = int(main['humidity'])
+        self.pressure = int(main['pressure'])
+        self.wind_speed = float(data['wind']['speed'])
+        self.sunrise = int(data['sys']['sunrise'])
+        self.sunset = int(data['sys']['sunset'])
+        self.timezone = int(data.get('timezone', 0))
+        self.description = sys.intern(weather.get('description', ''))
+        self.icon = sys.intern(weather.get('icon', ''))
+        self.dt = int(data.get('dt', 0))
+    
+    def nbytes(self):
+        """Approximate memory used by the record and its unshared values"""
+        return sys.getsizeof(self) + sum(sys.getsizeof(getattr(self, slot))
+                                         for slot in ('temp', 'feels_like', 'wind_speed'))
+
+class WeatherStore:
+    """Process-wide store of decoded weather shared by every Streamlit session
+    
+    Each location's data is decoded once into a CurrentConditions record and a
+    ForecastFrame; sessions only hold a WeatherHandle (location key + version).
+    The version increases whenever a location's data changes. Payloads are
+    compared by digest (the upstream body digest where known, otherwise a
+    hash of the payload), so storing the same data again neither decodes it
+    nor issues a new version. The least recently used locations are dropped
+    beyond max_locations, in which case get() returns None and the caller
+    reloads from the WeatherService cache.
+    """
+    
+    def __init__(self, max_locations=1000):
+        self.max_locations = max_locations
+        self._entries = OrderedDict()  # key -> (version, current, forecast, {part: digest})
+        self._versions = {}  # key -> last version issued, kept after eviction
+        self._lock = threading.Lock()
+    
+    def put(self, key, current_data, forecast_data, digests=None):
+        """Decode and store a location's payloads, returning its handle
+        
+        digests optionally maps 'current' and 'forecast' to known digests of
+        the payloads. Parts whose digest is unchanged keep their decoded objects.
+        """
+        known = digests or {}
+        digests = {'current': known.get('current') or content_digest(current_data),
+                   'forecast': (known.get('forecast') or content_digest(forecast_data)) if forecast_data else None}
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry[3] == digests:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+            return WeatherHandle(key, entry[0])
+        
+        old = entry[3] if entry is not None else {}
+        current = entry[1] if old.get('current') == digests['current'] else CurrentConditions(current_data)
+        if not forecast_data:
+            forecast = None
+        elif old.get('forecast') == digests['forecast']:
+            forecast = entry[2]
+        else:
+            forecast = ForecastFrame(forecast_data, digests['forecast'])
+        return self._replace(key, current, forecast, digests)
+    
+    def update(self, key, part, data, digest=None):
+        """Replace one part ('current' or 'forecast') of a stored location if its content changed
+        
+        digest is the payload's known digest, if any. Returns (handle, changed),
+        or (None, False) if the location is not stored.
+        """
+        digest = digest or content_digest(data)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None, False
+        if entry[3][part] == digest:
+            return WeatherHandle(key, entry[0]), False
+        
+        current, forecast = entry[1], entry[2]
+        if part == 'current':
+            current = CurrentConditions(data)
+        else:
+            forecast = ForecastFrame(data, digest)
+        return self._replace(key, current, forecast, dict(entry[3], **{part: digest})), True
+    
+    def _replace(self, key, current, forecast, digests):
+        with self._lock:
+            version = self._versions.get(key, 0) + 1
+            self._versions[key] = version
+            self._entries[key] = (version, current, forecast, digests)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_locations:
+                self._entries.popitem(last=False)
+        return WeatherHandle(key, version)
+    
+    def get(self, handle):
+        """Return (current, forecast) for a handle's location, or None if it was evicted"""
+        with self._lock:
+            entry = self._entries.get(handle.key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(handle.key)
+            return entry[1], entry[2]
+    
+    def current_version(self, key):
+        """Return the latest version stored for key (0 if never stored)"""
+        with self._lock:
+            return self._versions.get(key, 0)
+    
+    def digest(self, key, part):
+        """Return the content digest of a stored part, or None if it is not stored"""
+        with self._lock:
+            entry = self._entries.get(key)
+        return entry[3][part] if entry is not None else None
+    
+    @staticmethod
+    def _entry_bytes(current, forecast):
+        size = current.nbytes()
+        if forecast is not None:
+            size += int(forecast.df.memory_usage(deep=True).sum())
+        return size
+    
+    def session_usage(self, handle):
+        """Return (own_bytes, shared_bytes) for a session holding handle
+        
+        own_bytes is what the session stores itself; shared_bytes is the size
+        of the store entry it references, which other sessions may share.
+        """
+        own = sys.getsizeof(handle) + sys.getsizeof(handle.key)
+        with self._lock:
+            entry = self._entries.get(handle.key)
+        shared = self._entry_bytes(entry[1], entry[2]) if entry else 0
+        return own, shared
+    
+    def memory_usage(self):
+        """Return the number of stored locations and their total size in bytes"""
+        with self._lock:
+            entries = list(self._entries.values())
+        return {
+            'locations': len(entries),
+            'bytes': sum(self._entry_bytes(current, forecast) for _, current, forecast, _ in entries),
+        }